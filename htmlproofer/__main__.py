@@ -0,0 +1,56 @@
+"""Check the links of an already built site: `python -m htmlproofer site/`."""
+import argparse
+import logging
+import os.path
+import sys
+from typing import Dict, List, Optional
+
+from mkdocs import utils
+from mkdocs.exceptions import PluginError
+
+from htmlproofer.plugin import NAME
+from htmlproofer.site import check_site
+
+
+def load_plugin_options(config_file: str) -> Dict:
+    """Return the options of the plugin in a `mkdocs.yml` file, or no options if it isn't enabled there."""
+    with open(config_file, 'rb') as f:
+        config = utils.yaml_load(f) or {}
+    plugins = config.get('plugins') or []
+    if isinstance(plugins, dict):
+        plugins = [{name: options} for name, options in plugins.items()]
+    for plugin in plugins:
+        if isinstance(plugin, dict) and NAME in plugin:
+            return plugin[NAME] or {}
+    return {}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog=f'python -m {NAME}',
+        description='Validate the links and anchors of an already built MkDocs site.',
+    )
+    parser.add_argument('site_dir', help='the directory of the built site, e.g. site/')
+    parser.add_argument('-f', '--config-file', help="read the plugin's options from this mkdocs.yml")
+    parser.add_argument('-j', '--processes', type=int, help='number of processes reading pages (defaults to the CPU count)')
+    parser.add_argument('--skip-external', action='store_true', help="don't validate external URLs")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.site_dir):
+        parser.error(f"not a directory: {args.site_dir}")
+
+    logging.basicConfig(format='%(levelname)-7s -  %(message)s', level=logging.INFO)
+    options = load_plugin_options(args.config_file) if args.config_file else {}
+    options.pop('enabled', None)
+    if args.skip_external:
+        options['validate_external_urls'] = False
+
+    try:
+        check_site(args.site_dir, options, args.processes, args.config_file)
+    except PluginError as e:
+        utils.log.error(f"{NAME}: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
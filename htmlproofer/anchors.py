@@ -0,0 +1,177 @@
+import codecs
+from concurrent.futures import Future
+import re
+import threading
+from typing import AbstractSet, Callable, Dict, Generator, Iterable, NamedTuple, Optional, Set
+import urllib.parse
+
+from htmlproofer.checkers import StreamedResponse
+from htmlproofer.extract import AnchorCollector
+
+CHARSET_PATTERN = re.compile(r'charset="?([\w.:-]+)', re.IGNORECASE)
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+
+class AnchorCheck(NamedTuple):
+    status: int
+    final_url: str
+    # Whether the document has the anchor, or None if that is unknown
+    has_anchor: Optional[bool]
+
+
+class RemoteDocument:
+    """An external HTML document whose anchors are parsed as its body streams in.
+
+    Reading stops as soon as an anchor that is looked up has been found, and resumes
+    where it left off for the next anchor that hasn't been seen yet. The response is
+    closed once every anchor in `expected` has been seen, so that it doesn't hold a
+    connection while the document is cached, or once `max_bytes` have been read, after
+    which anchors that weren't seen are unknown.
+    """
+
+    def __init__(self, response: StreamedResponse, max_bytes: int, expected: AbstractSet[str] = frozenset()):
+        self.status = response.status
+        self.final_url = response.final_url
+        self.max_bytes = max_bytes
+        self.expected = expected
+        self.is_html = response.content_type.split(';')[0].strip().lower() in HTML_CONTENT_TYPES
+        self.truncated = False
+        self.complete = False
+        self._chunks: Optional[Generator[bytes, None, None]] = response.chunks
+        self._bytes_read = 0
+        self._collector = AnchorCollector()
+        match = CHARSET_PATTERN.search(response.content_type)
+        try:
+            decoder_factory = codecs.getincrementaldecoder(match.group(1) if match else 'utf-8')
+        except LookupError:
+            decoder_factory = codecs.getincrementaldecoder('utf-8')
+        self._decoder = decoder_factory(errors='replace')
+        self._lock = threading.RLock()
+        if not self.is_html or not 200 <= self.status < 300:
+            self.close()
+
+    def has_anchor(self, anchor: str) -> Optional[bool]:
+        """Whether the document has the anchor, or None if it isn't HTML, the anchor wasn't
+        found within `max_bytes`, or the response was closed before it was seen."""
+        if not self.is_html:
+            return None
+        with self._lock:
+            anchors = self._collector.anchors
+            while anchor not in anchors and self._chunks is not None:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    self._collector.feed(self._decoder.decode(b'', final=True))
+                    self.complete = True
+                    self.close()
+                    break
+                self._bytes_read += len(chunk)
+                self._collector.feed(self._decoder.decode(chunk))
+                if self._bytes_read >= self.max_bytes:
+                    self.truncated = True
+                    self.close()
+            if self._chunks is not None and self.expected <= anchors:
+                self.close()
+            if anchor in anchors:
+                return True
+            return False if self.complete else None
+
+    def is_released(self) -> bool:
+        """Whether the response was closed before the end of the document and `max_bytes`,
+        so that anchors that weren't seen yet need the document to be streamed again."""
+        with self._lock:
+            return self.is_html and self._chunks is None and not self.complete and not self.truncated
+
+    def close(self) -> None:
+        with self._lock:
+            if self._chunks is not None:
+                self._chunks.close()
+                self._chunks = None
+
+
+class ExternalAnchorCache:
+    """Checks the anchors (fragments) of external URLs, fetching each document once.
+
+    Documents are kept per URL without its fragment, so that links to many anchors
+    of the same page share a single streamed request. Concurrent checks of a document
+    that isn't cached yet wait for the same request. The anchors that are going to be
+    looked up are announced with `expect`, so that each document's response is closed
+    as soon as all of them have been seen; a document whose response was closed is
+    streamed again for an anchor that wasn't expected.
+    """
+
+    def __init__(self, open_stream: Callable[[str, Optional[float]], StreamedResponse], max_bytes: int):
+        self.open_stream = open_stream
+        self.max_bytes = max_bytes
+        self._documents: Dict[str, 'Future[RemoteDocument]'] = {}
+        # The anchors expected to be looked up in each document, by URL without fragment
+        self._expected: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def expect(self, urls: Iterable[str]) -> None:
+        """Announce the URLs whose anchors are going to be checked."""
+        with self._lock:
+            for url in urls:
+                document_url, fragment = urllib.parse.urldefrag(url)
+                if fragment:
+                    self._expected.setdefault(document_url, set()).add(urllib.parse.unquote(fragment))
+
+    def check(self, url: str, deadline: Optional[float] = None) -> AnchorCheck:
+        """Return the status of the URL's document, and whether it has the URL's anchor.
+
+        The document is requested before the deadline (in `time.monotonic()` seconds), if any.
+        """
+        self.expect([url])
+        document_url, fragment = urllib.parse.urldefrag(url)
+        document = self.get_document(document_url, deadline)
+        if not fragment or not 200 <= document.status < 300:
+            return AnchorCheck(document.status, document.final_url, None)
+        anchor = urllib.parse.unquote(fragment)
+        has_anchor = document.has_anchor(anchor)
+        if has_anchor is None and document.is_released():
+            self.forget(document_url, document)
+            document = self.get_document(document_url, deadline)
+            has_anchor = document.has_anchor(anchor)
+        return AnchorCheck(document.status, document.final_url, has_anchor)
+
+    def get_document(self, document_url: str, deadline: Optional[float] = None) -> RemoteDocument:
+        with self._lock:
+            future = self._documents.get(document_url)
+            if future is None:
+                result: 'Future[RemoteDocument]' = Future()
+                self._documents[document_url] = result
+            expected = self._expected.setdefault(document_url, set())
+        if future is not None:
+            return future.result()
+
+        try:
+            document = RemoteDocument(self.open_stream(document_url, deadline), self.max_bytes, expected)
+        except BaseException as e:
+            with self._lock:
+                del self._documents[document_url]
+            result.set_exception(e)
+            raise
+        result.set_result(document)
+        return document
+
+    def forget(self, document_url: str, document: RemoteDocument) -> None:
+        """Forget the document of the URL, unless it was already replaced by a newer one."""
+        with self._lock:
+            future = self._documents.get(document_url)
+            if future is not None and future.done() and future.exception() is None and future.result() is document:
+                del self._documents[document_url]
+
+    def discard(self, url: str) -> None:
+        """Forget the document of the URL, so that it is requested again."""
+        with self._lock:
+            future = self._documents.pop(urllib.parse.urldefrag(url)[0], None)
+        if future is not None and future.done() and future.exception() is None:
+            future.result().close()
+
+    def close(self) -> None:
+        """Close the responses of the documents that weren't read to the end."""
+        with self._lock:
+            futures, self._documents = list(self._documents.values()), {}
+            self._expected = {}
+        for future in futures:
+            if future.done() and future.exception() is None:
+                future.result().close()
@@ -0,0 +1,189 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future
+import json
+import os.path
+import threading
+import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+CACHE_FILE_NAME = 'htmlproofer-cache.jsonl'
+
+
+class CachedResult(NamedTuple):
+    status: int
+    timestamp: float
+    final_url: str
+
+
+class PersistentUrlCache:
+    """External URL check results kept across builds in a JSON-lines file.
+
+    Results are served until their TTL expires. Successful and failed results
+    have separate TTLs, so that broken links are rechecked sooner.
+    """
+
+    def __init__(self, cache_dir: str, success_ttl: float, failure_ttl: float):
+        self.path = os.path.join(cache_dir, CACHE_FILE_NAME)
+        self.success_ttl = success_ttl
+        self.failure_ttl = failure_ttl
+        self._entries: Dict[str, CachedResult] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_failure(status: int) -> bool:
+        return status < 0 or status >= 400
+
+    def is_expired(self, result: CachedResult, now: float) -> bool:
+        ttl = self.failure_ttl if self.is_failure(result.status) else self.success_ttl
+        return now - result.timestamp > ttl
+
+    def load(self) -> None:
+        """Read the cache file, if any. Unreadable lines are skipped."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+
+        now = time.time()
+        with self._lock:
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                    result = CachedResult(int(record['status']), float(record['timestamp']), str(record['final_url']))
+                    url = str(record['url'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if not self.is_expired(result, now):
+                    self._entries[url] = result
+
+    def save(self) -> None:
+        """Atomically rewrite the cache file with all unexpired results."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        now = time.time()
+        tmp_path = f'{self.path}.tmp'
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for url, result in self._entries.items():
+                    if not self.is_expired(result, now):
+                        f.write(json.dumps({'url': url, **result._asdict()}) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def get(self, url: str) -> Optional[CachedResult]:
+        """Return the cached result for the URL, unless it is missing or expired."""
+        with self._lock:
+            result = self._entries.get(url)
+        if result is None or self.is_expired(result, time.time()):
+            return None
+        return result
+
+    def set(self, url: str, status: int, final_url: str) -> None:
+        with self._lock:
+            self._entries[url] = CachedResult(status, time.time(), final_url)
+
+    def discard(self, url: str) -> None:
+        with self._lock:
+            self._entries.pop(url, None)
+
+
+class UrlResultCache:
+    """In-memory cache of external URL statuses, shared by the checks of a plugin instance.
+
+    The least recently used results are evicted beyond `max_size` entries, and
+    results expire after `ttl` seconds (if set), so that long `mkdocs serve`
+    sessions recheck URLs. Concurrent lookups of a URL that isn't cached yet
+    wait for a single fetch instead of each fetching it. Lookups are counted as hits
+    or misses once they return a status, so that fetches that raise (e.g. because
+    the URL's host is throttled, and the lookup is made again later) aren't counted.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float]):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[str, Tuple[int, float]]' = OrderedDict()
+        self._in_flight: Dict[str, 'Future[int]'] = {}
+        self._lock = threading.Lock()
+
+    def get_or_fetch(self, url: str, fetch: Callable[[], int]) -> int:
+        """Return the cached status of the URL, or fetch it once for every concurrent lookup."""
+        status, result, fetching = self._lookup(url)
+        if result is None:
+            assert status is not None
+            return self._hit(status)
+        if not fetching:
+            return self._hit(result.result())
+
+        try:
+            status = fetch()
+        except BaseException as e:
+            self._abandon(url, result, e)
+            raise
+        self._store(url, result, status)
+        return status
+
+    async def get_or_fetch_async(self, url: str, fetch: Callable[[], Awaitable[int]]) -> int:
+        """Like `get_or_fetch`, waiting on the event loop for a concurrent lookup's fetch."""
+        status, result, fetching = self._lookup(url)
+        if result is None:
+            assert status is not None
+            return self._hit(status)
+        if not fetching:
+            # Shielded, so that cancelling this lookup doesn't cancel the fetch of another one.
+            return self._hit(await asyncio.shield(asyncio.wrap_future(result)))
+
+        try:
+            status = await fetch()
+        except BaseException as e:
+            self._abandon(url, result, e)
+            raise
+        self._store(url, result, status)
+        return status
+
+    def _lookup(self, url: str) -> 'Tuple[Optional[int], Optional[Future[int]], bool]':
+        """Return the cached status of the URL, or else the future of its fetch, and
+        whether this lookup is the one to fetch it."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                status, timestamp = entry
+                if self.ttl is None or time.monotonic() - timestamp <= self.ttl:
+                    self._entries.move_to_end(url)
+                    return status, None, False
+                del self._entries[url]
+
+            in_flight = self._in_flight.get(url)
+            if in_flight is not None:
+                return None, in_flight, False
+            result: 'Future[int]' = Future()
+            self._in_flight[url] = result
+            return None, result, True
+
+    def _hit(self, status: int) -> int:
+        with self._lock:
+            self.hits += 1
+        return status
+
+    def _abandon(self, url: str, result: 'Future[int]', exception: BaseException) -> None:
+        with self._lock:
+            del self._in_flight[url]
+        result.set_exception(exception)
+
+    def _store(self, url: str, result: 'Future[int]', status: int) -> None:
+        with self._lock:
+            del self._in_flight[url]
+            self.misses += 1
+            self._entries[url] = (status, time.monotonic())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        result.set_result(status)
+
+    def discard(self, url: str) -> None:
+        with self._lock:
+            self._entries.pop(url, None)
+
+    def reset_counters(self) -> None:
+        self.hits = 0
+        self.misses = 0
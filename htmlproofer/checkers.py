@@ -0,0 +1,385 @@
+from abc import ABC, abstractmethod
+import asyncio
+import concurrent.futures
+import threading
+from typing import (
+    Any,
+    Coroutine,
+    Dict,
+    Generator,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
+import urllib.parse
+
+from mkdocs.exceptions import PluginError
+import requests
+from requests.adapters import HTTPAdapter
+
+from htmlproofer.ratelimit import HostLimiter, check_deadline
+
+CHUNK_SIZE = 1024 * 1024
+# Smaller chunks for streamed documents, whose reading can stop early.
+STREAM_CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
+CHECKER_BACKENDS = ('requests', 'asyncio')
+PROBE_METHODS = ('get', 'head')
+# Statuses with which servers commonly reject HEAD requests for resources that do exist.
+HEAD_REJECTED_STATUSES = (403, 405, 501)
+# Only ask for the first byte when falling back from HEAD to GET.
+RANGE_HEADERS = {'Range': 'bytes=0-0'}
+# Number of hosts whose connection pools are kept, the least recently used ones being closed.
+HOST_POOLS = 100
+# Number of connections the `asyncio` backend opens at most, unless `max_connections` is set.
+DEFAULT_MAX_CONNECTIONS = 100
+
+T = TypeVar('T')
+
+
+class Timeout(NamedTuple):
+    """How long (in seconds) to wait for a connection, and for the server to send data."""
+    connect: float
+    read: float
+
+
+class StreamedResponse(NamedTuple):
+    """A response whose body is read as it is iterated. Closing `chunks` closes the response."""
+    status: int
+    final_url: str
+    content_type: str
+    chunks: Generator[bytes, None, None]
+
+
+def no_chunks() -> Generator[bytes, None, None]:
+    """The body of a response that failed."""
+    yield from ()
+
+
+class UrlChecker(ABC):
+    """Fetches external URLs and returns their status and final URL after redirects.
+
+    A status of 504 means the request timed out and -1 means the connection failed
+    or there were too many redirects. Requests are subject to the per-host limits
+    of the limiter: `fetch` and `open_stream` raise `HostThrottled` when a host's
+    limits don't allow a request yet, rather than block the calling thread.
+
+    With the `head` probe method, a HEAD request is tried first, falling back to
+    a ranged GET that is closed after the headers when the server rejects HEAD.
+    Hosts for which the fallback worked are remembered, and get the GET directly.
+
+    A single number as `timeout` applies to both connecting and reading. Hosts can
+    override either with their `connect_timeout` and `read_timeout` limits. Given a
+    deadline (in `time.monotonic()` seconds), requests time out by then at the latest,
+    and `DeadlineExceeded` is raised if they can't be made before it.
+    """
+
+    def __init__(
+            self,
+            *,
+            skip_downloads: bool,
+            timeout: Union[float, Timeout],
+            headers: Dict[str, str],
+            limiter: Optional[HostLimiter] = None,
+            probe_method: str = 'get',
+    ):
+        self.skip_downloads = skip_downloads
+        self.timeout = timeout if isinstance(timeout, Timeout) else Timeout(timeout, timeout)
+        self.headers = headers
+        self.limiter = limiter or HostLimiter()
+        self.probe_method = probe_method
+        self.head_unsupported_hosts: Set[str] = set()
+
+    def should_try_head(self, host: str) -> bool:
+        return self.probe_method == 'head' and host not in self.head_unsupported_hosts
+
+    def note_head_fallback(self, host: str, status: int) -> None:
+        """Remember hosts that reject HEAD requests but answer the GET fallback."""
+        if status < 400:
+            self.head_unsupported_hosts.add(host)
+
+    def get_timeout(self, host: str, deadline: Optional[float] = None) -> Timeout:
+        limit = self.limiter.get_limit(host)
+        timeout = Timeout(
+            self.timeout.connect if limit.connect_timeout is None else limit.connect_timeout,
+            self.timeout.read if limit.read_timeout is None else limit.read_timeout,
+        )
+        remaining = check_deadline(deadline)
+        if remaining is not None:
+            timeout = Timeout(min(timeout.connect, remaining), min(timeout.read, remaining))
+        return timeout
+
+    @staticmethod
+    def get_host(url: str) -> str:
+        return urllib.parse.urlsplit(url).hostname or ''
+
+    @abstractmethod
+    def fetch(self, url: str, deadline: Optional[float] = None) -> Tuple[int, str]:
+        """Request the URL, returning its status and the final URL after redirects."""
+
+    @abstractmethod
+    def open_stream(self, url: str, deadline: Optional[float] = None) -> StreamedResponse:
+        """GET the URL, returning once the headers have been received. The body is read
+        lazily from the chunks, which end early if reading fails."""
+
+    def close(self) -> None:
+        pass
+
+
+class RequestsChecker(UrlChecker):
+    """Blocking checker built on `requests`, with one session shared by all worker threads.
+
+    The session's connection pools are thread-safe, and keep up to `pool_size_per_host`
+    connections open to each host, so that requests to a host reuse warm connections
+    (and TLS sessions) for the whole build.
+    """
+
+    def __init__(self, *, pool_size_per_host: int = 10, keep_alive: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update(self.headers)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+        self.session.max_redirects = MAX_REDIRECTS
+        adapter = HTTPAdapter(pool_connections=HOST_POOLS, pool_maxsize=pool_size_per_host)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def fetch(self, url: str, deadline: Optional[float] = None) -> Tuple[int, str]:
+        host = self.get_host(url)
+        with self.limiter.slot(host, deadline):
+            return self._fetch(url, host, deadline)
+
+    def _fetch(self, url: str, host: str, deadline: Optional[float]) -> Tuple[int, str]:
+        try:
+            response = self._request(url, host, deadline)
+            self.limiter.observe(host, response.status_code, response.headers.get('Retry-After'))
+            return response.status_code, response.url
+        except requests.exceptions.Timeout:
+            return 504, url
+        except requests.exceptions.TooManyRedirects:
+            return -1, url
+        except requests.exceptions.ConnectionError:
+            return -1, url
+
+    def _request(self, url: str, host: str, deadline: Optional[float]) -> requests.Response:
+        session = self.session
+        timeout = self.get_timeout(host, deadline)
+        if self.probe_method == 'head':
+            if self.should_try_head(host):
+                response = session.head(url, timeout=timeout, allow_redirects=True)
+                if response.status_code not in HEAD_REJECTED_STATUSES:
+                    return response
+                response = self._get_headers_only(session, url, timeout)
+                self.note_head_fallback(host, response.status_code)
+                return response
+            return self._get_headers_only(session, url, timeout)
+
+        response = session.get(url, timeout=timeout, stream=True)
+        if self.skip_downloads is False:
+            # Download the entire contents as to not break previous behaviour.
+            for _ in response.iter_content(chunk_size=CHUNK_SIZE):
+                pass
+        return response
+
+    def _get_headers_only(self, session: requests.Session, url: str, timeout: Timeout) -> requests.Response:
+        response = session.get(url, timeout=timeout, stream=True, headers=RANGE_HEADERS)
+        response.close()
+        if response.status_code == 416:
+            # Empty resources can't satisfy a range, so ask for all of it instead.
+            response = session.get(url, timeout=timeout, stream=True)
+            response.close()
+        return response
+
+    def open_stream(self, url: str, deadline: Optional[float] = None) -> StreamedResponse:
+        host = self.get_host(url)
+        with self.limiter.slot(host, deadline):
+            try:
+                response = self.session.get(url, timeout=self.get_timeout(host, deadline), stream=True)
+            except requests.exceptions.Timeout:
+                return StreamedResponse(504, url, '', no_chunks())
+            except (requests.exceptions.TooManyRedirects, requests.exceptions.ConnectionError):
+                return StreamedResponse(-1, url, '', no_chunks())
+            self.limiter.observe(host, response.status_code, response.headers.get('Retry-After'))
+        content_type = response.headers.get('Content-Type', '')
+        return StreamedResponse(response.status_code, response.url, content_type, self._iter_chunks(response))
+
+    @staticmethod
+    def _iter_chunks(response: requests.Response) -> Generator[bytes, None, None]:
+        try:
+            yield from response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+        except requests.exceptions.RequestException:
+            return
+        finally:
+            response.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncioChecker(UrlChecker):
+    """Checker built on `httpx`, multiplexing every request of the build on one asyncio
+    event loop, so connections (and HTTP/2 streams) are reused across the whole build.
+
+    The event loop runs in a background thread. `fetch_async` checks a URL as a task of
+    the loop, so the number of requests in flight is only bounded by `max_connections`:
+    requests beyond it wait for a connection on the loop. `fetch` can be called from any
+    thread and blocks until its request has completed on the loop.
+    """
+
+    def __init__(self, *, max_connections: Optional[int] = None, keep_alive: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        try:
+            import httpx
+        except ImportError:
+            raise PluginError(
+                "The 'asyncio' checker backend requires httpx: pip install mkdocs-htmlproofer-plugin[async]"
+            )
+        self._httpx = httpx
+
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+
+        max_connections = max_connections or DEFAULT_MAX_CONNECTIONS
+        self._connections = asyncio.Semaphore(max_connections)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='htmlproofer-asyncio', daemon=True)
+        self._thread.start()
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            verify=False,
+            headers=self.headers,
+            follow_redirects=True,
+            max_redirects=MAX_REDIRECTS,
+            timeout=self._get_httpx_timeout(self.timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections if keep_alive else 0,
+            ),
+        )
+
+    def _get_httpx_timeout(self, timeout: Timeout):
+        return self._httpx.Timeout(timeout.read, connect=timeout.connect)
+
+    def submit(self, coroutine: Coroutine[Any, Any, T]) -> 'concurrent.futures.Future[T]':
+        """Run the coroutine as a task of the event loop, returning a future of its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def _run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Run the coroutine on the event loop, blocking until it completes."""
+        return self.submit(coroutine).result()
+
+    async def fetch_async(self, url: str, deadline: Optional[float] = None) -> Tuple[int, str]:
+        """Like `fetch`, as a coroutine of the event loop, waiting there for the host's limits to allow the request."""
+        host = self.get_host(url)
+        async with self.limiter.async_slot(host, deadline):
+            return await self._fetch_in_slot(url, host, deadline)
+
+    def fetch(self, url: str, deadline: Optional[float] = None) -> Tuple[int, str]:
+        host = self.get_host(url)
+        with self.limiter.slot(host, deadline):
+            return self._run(self._fetch_in_slot(url, host, deadline))
+
+    async def _fetch_in_slot(self, url: str, host: str, deadline: Optional[float]) -> Tuple[int, str]:
+        httpx = self._httpx
+        try:
+            async with self._connections:
+                status, final_url, retry_after = await self._request(url, host, deadline)
+            self.limiter.observe(host, status, retry_after)
+            return status, final_url
+        except httpx.TimeoutException:
+            return 504, url
+        except (httpx.TooManyRedirects, httpx.TransportError):
+            return -1, url
+
+    async def _request(self, url: str, host: str, deadline: Optional[float]) -> Tuple[int, str, Optional[str]]:
+        timeout = self._get_httpx_timeout(self.get_timeout(host, deadline))
+        if self.probe_method == 'head':
+            if self.should_try_head(host):
+                response = await self._client.head(url, timeout=timeout)
+                if response.status_code not in HEAD_REJECTED_STATUSES:
+                    return response.status_code, str(response.url), response.headers.get('Retry-After')
+                result = await self._get_headers_only(url, timeout)
+                self.note_head_fallback(host, result[0])
+                return result
+            return await self._get_headers_only(url, timeout)
+
+        async with self._client.stream('GET', url, timeout=timeout) as response:
+            if self.skip_downloads is False:
+                async for _ in response.aiter_raw(CHUNK_SIZE):
+                    pass
+            return response.status_code, str(response.url), response.headers.get('Retry-After')
+
+    async def _get_headers_only(self, url: str, timeout) -> Tuple[int, str, Optional[str]]:
+        async with self._client.stream('GET', url, headers=RANGE_HEADERS, timeout=timeout) as response:
+            status = response.status_code
+        if status == 416:
+            # Empty resources can't satisfy a range, so ask for all of it instead.
+            async with self._client.stream('GET', url, timeout=timeout) as response:
+                status = response.status_code
+        return status, str(response.url), response.headers.get('Retry-After')
+
+    def open_stream(self, url: str, deadline: Optional[float] = None) -> StreamedResponse:
+        host = self.get_host(url)
+        with self.limiter.slot(host, deadline):
+            return self._run(self._open_stream(url, host, deadline))
+
+    async def _open_stream(self, url: str, host: str, deadline: Optional[float]) -> StreamedResponse:
+        httpx = self._httpx
+        timeout = self._get_httpx_timeout(self.get_timeout(host, deadline))
+        request = self._client.build_request('GET', url, timeout=timeout)
+        try:
+            response = await self._client.send(request, stream=True)
+        except httpx.TimeoutException:
+            return StreamedResponse(504, url, '', no_chunks())
+        except (httpx.TooManyRedirects, httpx.TransportError):
+            return StreamedResponse(-1, url, '', no_chunks())
+        self.limiter.observe(host, response.status_code, response.headers.get('Retry-After'))
+        content_type = response.headers.get('Content-Type', '')
+        return StreamedResponse(response.status_code, str(response.url), content_type, self._iter_chunks(response))
+
+    def _iter_chunks(self, response) -> Generator[bytes, None, None]:
+        """Read the body of a streamed response on the event loop, one chunk at a time."""
+        chunks = response.aiter_bytes(STREAM_CHUNK_SIZE)
+        try:
+            while True:
+                try:
+                    yield self._run(chunks.__anext__())
+                except (StopAsyncIteration, self._httpx.HTTPError):
+                    return
+        finally:
+            self._run(response.aclose())
+
+    def close(self) -> None:
+        self._run(self._aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _aclose(self) -> None:
+        # Checks that are still running, when the build failed, are abandoned.
+        tasks = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._client.aclose()
+
+
+def create_checker(
+        backend: str,
+        *,
+        max_connections: Optional[int] = None,
+        pool_size_per_host: int = 10,
+        **kwargs,
+) -> UrlChecker:
+    """Create the checker for one of the `CHECKER_BACKENDS`."""
+    if backend == 'asyncio':
+        return AsyncioChecker(max_connections=max_connections, **kwargs)
+    return RequestsChecker(pool_size_per_host=pool_size_per_host, **kwargs)
@@ -0,0 +1,109 @@
+from html.parser import HTMLParser
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+HTML_PARSERS = ('beautifulsoup', 'stream')
+
+# Optimization: only parse links and headings
+# li, sup are used for footnotes
+STRAINED_TAGS = ('a', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'sup', 'img')
+
+# Elements without content, which BeautifulSoup closes right away.
+VOID_ELEMENTS = frozenset((
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer',
+))
+
+
+class PageLinks(NamedTuple):
+    element_ids: Set[str]
+    urls: Set[str]
+
+
+def extract_links_with_beautifulsoup(content: str, anchor_names: bool = False) -> PageLinks:
+    """Collect the element ids and the link/image URLs of a page by parsing it into a tree.
+
+    With `anchor_names`, the names of `<a name="...">` anchors are collected as ids too.
+    """
+    soup = BeautifulSoup(content, 'html.parser', parse_only=SoupStrainer(STRAINED_TAGS))
+
+    element_ids = set(str(tag['id']) for tag in soup.select('[id]'))
+    if anchor_names:
+        element_ids.update(str(a['name']) for a in soup.find_all('a', attrs={'name': True}))
+    urls = (set(str(a['href']) for a in soup.find_all('a', href=True)) |
+            set(str(img['src']) for img in soup.find_all('img', src=True)))
+    return PageLinks(element_ids, urls)
+
+
+class _LinkExtractor(HTMLParser):
+    """Collects the same element ids and URLs as `extract_links_with_beautifulsoup`
+    from parser callbacks, in a single pass and without building a tree.
+
+    Like BeautifulSoup with a `SoupStrainer`, only elements that are one of the
+    `STRAINED_TAGS`, or are nested in one, are considered.
+    """
+
+    def __init__(self, anchor_names: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.anchor_names = anchor_names
+        self.element_ids: Set[str] = set()
+        self.urls: Set[str] = set()
+        # The open elements that are considered, outermost first.
+        self._open: List[str] = []
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        if not self._open and tag not in STRAINED_TAGS:
+            return
+
+        # Later duplicate attributes replace earlier ones, and valueless ones are empty.
+        attributes: Dict[str, str] = {name: value or '' for name, value in attrs}
+        if 'id' in attributes:
+            self.element_ids.add(attributes['id'])
+        if tag == 'a' and 'href' in attributes:
+            self.urls.add(attributes['href'])
+        if tag == 'a' and self.anchor_names and 'name' in attributes:
+            self.element_ids.add(attributes['name'])
+        elif tag == 'img' and 'src' in attributes:
+            self.urls.add(attributes['src'])
+
+        if tag not in VOID_ELEMENTS:
+            self._open.append(tag)
+
+    def handle_endtag(self, tag: str) -> None:
+        # Close the innermost open element with that name, and everything nested in it.
+        # End tags of elements that aren't open are ignored.
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i] == tag:
+                del self._open[i:]
+                return
+
+
+def extract_links_with_stream(content: str, anchor_names: bool = False) -> PageLinks:
+    """Collect the element ids and the link/image URLs of a page in a single streaming pass."""
+    extractor = _LinkExtractor(anchor_names)
+    extractor.feed(content)
+    extractor.close()
+    return PageLinks(extractor.element_ids, extractor.urls)
+
+
+class AnchorCollector(HTMLParser):
+    """Collects the anchors of a document that is fed to it piece by piece: the ids of
+    all its elements, and the names of its `<a>` elements."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.anchors: Set[str] = set()
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]) -> None:
+        for name, value in attrs:
+            if value and (name == 'id' or (name == 'name' and tag == 'a')):
+                self.anchors.add(value)
+
+
+def extract_links(content: str, parser: str = 'beautifulsoup', anchor_names: bool = False) -> PageLinks:
+    """Collect the element ids and the link/image URLs of a page with one of the `HTML_PARSERS`."""
+    if parser == 'stream':
+        return extract_links_with_stream(content, anchor_names)
+    return extract_links_with_beautifulsoup(content, anchor_names)
@@ -1,16 +1,32 @@
+import asyncio
 import concurrent.futures
+from contextvars import ContextVar
 import fnmatch
-from functools import lru_cache, partial
+from functools import partial
+import hashlib
 import os.path
 import pathlib
+import random
 import re
 import threading
 import time
-from typing import Dict, List, Optional, Set
+from typing import (
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+    cast,
+)
 import urllib.parse
 import uuid
 
-from bs4 import BeautifulSoup, SoupStrainer
 from markdown.extensions.toc import slugify
 from mkdocs import utils
 from mkdocs.config import Config, config_options
@@ -18,13 +34,35 @@ from mkdocs.exceptions import PluginError
 from mkdocs.plugins import BasePlugin
 from mkdocs.structure.files import File, Files
 from mkdocs.structure.pages import Page
-import requests
 import urllib3
 
+from htmlproofer.anchors import ExternalAnchorCache
+from htmlproofer.cache import PersistentUrlCache, UrlResultCache
+from htmlproofer.checkers import (
+    CHECKER_BACKENDS,
+    PROBE_METHODS,
+    AsyncioChecker,
+    Timeout,
+    UrlChecker,
+    create_checker,
+)
+from htmlproofer.extract import HTML_PARSERS, extract_links
+from htmlproofer.ratelimit import CircuitBreaker, DeadlineExceeded, HostLimiter, HostThrottled
+from htmlproofer.report import BuildReport
+from htmlproofer.results import RESULTS_FORMATS, LinkResult, ResultSink, open_result_sink
+from htmlproofer.scheduler import RetryScheduler
+
 URL_TIMEOUT = 10.0
+# Status of external URLs that weren't checked because the `external_check_budget` ran out
+UNCHECKED_STATUS = -2
+# Status of external URLs that weren't requested because their host's circuit breaker is open
+HOST_DOWN_STATUS = -3
+RETRY_BASE_DELAY = 2.0
 _URL_BOT_ID = f'Bot {uuid.uuid4()}'
 URL_HEADERS = {'User-Agent': _URL_BOT_ID, 'Accept-Language': '*'}
 NAME = "htmlproofer"
+# Where the anchors of other pages are collected from: their Markdown source, or their rendered HTML
+ANCHOR_SOURCES = ('markdown', 'html')
 
 MARKDOWN_ANCHOR_PATTERN = re.compile(r'([^#]+)(#(.+))?')
 HEADING_PATTERN = re.compile(r'\s*#+\s*(.*)')
@@ -46,6 +84,9 @@ EMOJI_PATTERN = re.compile(r'\:[a-z0-9_-]+\:')
 
 urllib3.disable_warnings()
 
+# Whether the last external URL looked up by the current thread, or event loop task, was served from a cache
+_from_cache: ContextVar[bool] = ContextVar('htmlproofer_from_cache', default=False)
+
 
 def log_info(msg, *args, **kwargs):
     utils.log.info(f"{NAME}: {msg}", *args, **kwargs)
@@ -59,9 +100,239 @@ def log_error(msg, *args, **kwargs):
     utils.log.error(f"{NAME}: {msg}", *args, **kwargs)
 
 
+def compile_patterns(patterns: Sequence[str]) -> Optional[Pattern[str]]:
+    """Compile unix style wildcard patterns, like those of `fnmatch.fnmatch`, into a single
+    regular expression, or None if there are no patterns."""
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{fnmatch.translate(os.path.normcase(pattern))})' for pattern in patterns))
+
+
+def matches_pattern(name: str, pattern: Optional[Pattern[str]]) -> bool:
+    """Whether the name matches patterns compiled by `compile_patterns`."""
+    return pattern is not None and pattern.match(os.path.normcase(name)) is not None
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url: str, keep_fragment: bool = False, sort_query: bool = False) -> str:
+    """Return the form of an external URL under which it is requested and cached, so that
+    URLs for the same request share a single fetch.
+
+    The fragment is dropped (unless `keep_fragment`), the host is lowercased, the default
+    port and an empty path are normalized, and the query parameters are optionally sorted
+    by name (keeping the order of repeated parameters).
+    """
+    parts = urllib.parse.urlsplit(url)
+    try:
+        port = parts.port
+    except ValueError:
+        return url
+    host = parts.hostname or ''
+    if ':' in host:
+        host = f'[{host}]'
+    userinfo, _, _ = parts.netloc.rpartition('@')
+    netloc = f'{userinfo}@{host}' if userinfo else host
+    if port is not None and port != DEFAULT_PORTS.get(parts.scheme):
+        netloc = f'{netloc}:{port}'
+    query = parts.query
+    if sort_query and query:
+        query = '&'.join(sorted(query.split('&'), key=lambda param: param.partition('=')[0]))
+    fragment = parts.fragment if keep_fragment else ''
+    return urllib.parse.urlunsplit((parts.scheme, netloc, parts.path or '/', query, fragment))
+
+
+class FileIndex(Dict[str, File]):
+    """Build-scoped lookup of files by their normalized URL and source URI.
+
+    Built once per build, after all files are final, and shared by every page.
+    The quoted parent directory of each file's destination is resolved up front
+    so that relative links don't need to rebuild it for every lookup.
+
+    If `page_ids` is given, the anchors of a page are the element ids of its rendered
+    HTML, keyed by the page's destination path, rather than those of its Markdown source.
+    """
+
+    def __init__(
+            self,
+            files: Iterable[File],
+            report: Optional[BuildReport] = None,
+            page_ids: Optional[Dict[str, FrozenSet[str]]] = None,
+    ):
+        super().__init__()
+        self.report = report
+        self.page_ids = page_ids
+        files = list(files)
+        self.update({os.path.normpath(file.url): file for file in files})
+        self.update({os.path.normpath(file.src_uri): file for file in files})
+        self.dest_dirs: Dict[str, str] = {
+            key: urllib.parse.quote(str(pathlib.Path(file.dest_uri).parent), safe='/\\')
+            for key, file in self.items()
+        }
+        self._anchors: Dict[str, FrozenSet[str]] = {}
+        self._valid_targets: Dict[Tuple[str, Optional[str]], bool] = {}
+
+    def is_target_valid(self, search_path: str, anchor: Optional[str]) -> bool:
+        """Whether a file is indexed under the search path and has the anchor, if any.
+
+        The result is memoized, so that links to the same target from many pages are only validated once.
+        """
+        key = (search_path, anchor)
+        valid = self._valid_targets.get(key)
+        if valid is None:
+            file = self.get(search_path)
+            valid = file is not None and HtmlProoferPlugin.is_anchor_valid(file, anchor, self)
+            self._valid_targets[key] = valid
+        return valid
+
+    def get_anchors(self, file: File) -> Optional[FrozenSet[str]]:
+        """Return the anchors of a Markdown file, collecting them on first use."""
+        if self.page_ids is not None:
+            return self.page_ids.get(file.dest_uri)
+        anchors = self._anchors.get(file.src_uri)
+        if anchors is None:
+            if file.page is None or file.page.markdown is None:
+                return None
+            if self.report is None:
+                anchors = HtmlProoferPlugin.get_anchors(file.page.markdown)
+            else:
+                with self.report.measure('anchors'):
+                    anchors = HtmlProoferPlugin.get_anchors(file.page.markdown)
+            self._anchors[file.src_uri] = anchors
+        return anchors
+
+    def get_fingerprint(self, search_path: str) -> Optional[int]:
+        """Return a fingerprint of the file a link resolves to, covering its anchors,
+        or None if there is no such file.
+
+        Rendered anchors are left out, since links to them are checked again on every build.
+        """
+        file = self.get(search_path)
+        if file is None:
+            return None
+        if self.page_ids is not None:
+            return hash((file.src_uri, None))
+        return hash((file.src_uri, self.get_anchors(file)))
+
+    def snapshot(self) -> 'FileIndex':
+        """Return a picklable copy of the index for checking pages in worker processes.
+
+        Files are replaced by `FileRecord`s, and the anchors of every Markdown file
+        are collected up front since the records don't carry their pages.
+        """
+        snapshot = FileIndex((), page_ids=None if self.page_ids is None else dict(self.page_ids))
+        for key, file in self.items():
+            self.get_anchors(file)
+            snapshot[key] = cast(File, FileRecord(file.src_uri, file.dest_uri, file.url))
+        snapshot.dest_dirs = dict(self.dest_dirs)
+        snapshot._anchors = dict(self._anchors)
+        snapshot._valid_targets = dict(self._valid_targets)
+        return snapshot
+
+
+class FileRecord(NamedTuple):
+    """The attributes of a `File` that link checks use, without its page."""
+    src_uri: str
+    dest_uri: str
+    url: str
+    page: None = None
+
+
+class PageLinkStatuses(NamedTuple):
+    """The links of a page, with the status of its internal links, as checked by a worker process."""
+    urls: Set[str]
+    internal_statuses: Dict[str, int]
+    phase_times: Dict[str, float]
+    element_ids: FrozenSet[str]
+
+
+class PendingPage(NamedTuple):
+    """A page handed off to a worker process, to be reported at the end of the build."""
+    src_path: str
+    dest_uri: str
+    page_ignored: bool
+    content_hash: Optional[str]
+    future: 'concurrent.futures.Future[PageLinkStatuses]'
+
+
+# The state of a page worker process, set by `init_page_worker`.
+_worker_files: Optional[FileIndex] = None
+_worker_html_parser = 'beautifulsoup'
+_worker_anchor_names = False
+
+
+def init_page_worker(files: FileIndex, html_parser: str, anchor_names: bool = False) -> None:
+    global _worker_files, _worker_html_parser, _worker_anchor_names
+    _worker_files = files
+    _worker_html_parser = html_parser
+    _worker_anchor_names = anchor_names
+
+
+def check_page_links(content: str, src_path: str) -> PageLinkStatuses:
+    """Extract the links of a page and check its internal ones, in a page worker process."""
+    assert _worker_files is not None, 'page worker was not initialized'
+    report = BuildReport()
+    with report.measure('parse'):
+        all_element_ids, urls = extract_links(content, _worker_html_parser, _worker_anchor_names)
+    all_element_ids.add('')  # Empty anchor is commonly used, but not real
+
+    with report.measure('internal'):
+        internal_statuses = {
+            url: HtmlProoferPlugin.get_internal_url_status(url, src_path, all_element_ids, _worker_files)
+            for url in urls
+            if not urllib.parse.urlsplit(url).scheme
+        }
+    return PageLinkStatuses(urls, internal_statuses, report.phase_times, frozenset(all_element_ids))
+
+
+class UrlChecks(NamedTuple):
+    """URL checks submitted to the build's worker threads, with the pages (source paths)
+    that reference each URL."""
+    urls: Dict[str, List[str]]
+    futures: 'Dict[concurrent.futures.Future[int], str]'
+    # The latency of each URL's last check, and whether its status came from a cache
+    latencies: Dict[str, Tuple[float, bool]]
+
+
+class CheckingPage(NamedTuple):
+    """A page whose URLs are being checked by the build's worker threads."""
+    src_path: str
+    content_hash: Optional[str]
+    targets: Dict[str, Optional[int]]
+    deferred_urls: List[str]
+    checks: UrlChecks
+
+
+class PageCheckResult(NamedTuple):
+    """The outcome of checking a page, kept to skip rechecking it on `mkdocs serve` rebuilds."""
+    content_hash: str
+    # Fingerprints of the files that the page's internal links resolve to
+    targets: Dict[str, Optional[int]]
+    # Invalid URLs found on the page, with their status
+    invalid_urls: Dict[str, int]
+    # External URLs and links to anchors of other pages, checked at the end of the build
+    deferred_urls: List[str]
+
+
 class HtmlProoferPlugin(BasePlugin):
     files: List[File]
     invalid_links = False
+    _file_index: Optional[FileIndex] = None
+    persistent_cache: Optional[PersistentUrlCache] = None
+    url_cache: Optional[UrlResultCache] = None
+    checker: Optional[UrlChecker] = None
+    external_anchors: Optional[ExternalAnchorCache] = None
+    circuit_breaker: Optional[CircuitBreaker] = None
+    page_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+    url_pool: Optional[concurrent.futures.ThreadPoolExecutor] = None
+    retry_scheduler: Optional[RetryScheduler] = None
+    result_sink: Optional[ResultSink] = None
+    # The `ignore_urls` and `ignore_pages` options, compiled in `on_config`
+    ignore_urls_pattern: Optional[Pattern[str]] = None
+    # The compiled `raise_error_excludes` patterns, by status
+    raise_error_excludes: Dict[int, Optional[Pattern[str]]] = {}
+    ignore_pages_pattern: Optional[Pattern[str]] = None
 
     config_scheme = (
         ("enabled", config_options.Type(bool, default=True)),
@@ -69,98 +340,628 @@ class HtmlProoferPlugin(BasePlugin):
         ('raise_error_after_finish', config_options.Type(bool, default=False)),
         ('raise_error_excludes', config_options.Type(dict, default={})),
         ('skip_downloads', config_options.Type(bool, default=False)),
+        ('probe_method', config_options.Choice(PROBE_METHODS, default='get')),
         ('validate_external_urls', config_options.Type(bool, default=True)),
+        ('validate_external_anchors', config_options.Type(bool, default=False)),
+        ('external_anchor_max_bytes', config_options.Type(int, default=5 * 1024 * 1024)),
+        ('defer_external_urls', config_options.Type(bool, default=False)),
         ('validate_rendered_template', config_options.Type(bool, default=False)),
+        ('html_parser', config_options.Choice(HTML_PARSERS, default='beautifulsoup')),
+        ('anchor_source', config_options.Choice(ANCHOR_SOURCES, default='markdown')),
         ('ignore_urls', config_options.Type(list, default=[])),
         ('warn_on_ignored_urls', config_options.Type(bool, default=False)),
         ('ignore_pages', config_options.Type(list, default=[])),
         ('retry_max_times', config_options.Type(int, default=0)),
         ('max_workers', config_options.Type(int, default=None)),
+        ('connect_timeout', config_options.Type((int, float), default=URL_TIMEOUT)),
+        ('read_timeout', config_options.Type((int, float), default=URL_TIMEOUT)),
+        ('external_check_budget', config_options.Type((int, float), default=None)),
+        ('url_cache_size', config_options.Type(int, default=1000)),
+        ('url_cache_ttl', config_options.Type(int, default=10 * 60)),
+        ('cache_dir', config_options.Type(str, default=None)),
+        ('cache_success_ttl', config_options.Type(int, default=7 * 24 * 60 * 60)),
+        ('cache_failure_ttl', config_options.Type(int, default=60 * 60)),
+        ('checker_backend', config_options.Choice(CHECKER_BACKENDS, default='requests')),
+        ('max_connections', config_options.Type(int, default=None)),
+        ('pool_size_per_host', config_options.Type(int, default=10)),
+        ('keep_alive', config_options.Type(bool, default=True)),
+        ('host_limits', config_options.Type(dict, default={})),
+        ('sort_query_params', config_options.Type(bool, default=False)),
+        ('circuit_breaker_threshold', config_options.Type(int, default=0)),
+        ('circuit_breaker_cooldown', config_options.Type((int, float), default=None)),
+        ('incremental', config_options.Type(bool, default=False)),
+        ('processes', config_options.Type(int, default=0)),
+        ('performance_report', config_options.Type(str, default=None)),
+        ('performance_report_top', config_options.Type(int, default=10)),
+        ('results_file', config_options.Type(str, default=None)),
+        ('results_format', config_options.Choice(RESULTS_FORMATS, default='jsonl')),
     )
 
-    def __init__(self):
-        self._local = threading.local()
+    def __init__(self) -> None:
+        self._init_lock = threading.Lock()
         self.files = []
+        self.deferred_urls: Dict[str, List[str]] = {}
+        # Links to anchors of other pages, with the page (source path) they're on
+        self.deferred_anchors: List[Tuple[str, str]] = []
+        # The element ids of each rendered page, by destination path
+        self.page_ids: Dict[str, FrozenSet[str]] = {}
+        self.page_results: Dict[str, PageCheckResult] = {}
+        self.pending_pages: List[PendingPage] = []
+        self.checking_pages: List[CheckingPage] = []
+        self.report = BuildReport()
+        self._config_dir = ''
+        self._config_hash: Optional[int] = None
+        self._reused_pages = 0
+        self._external_deadline: Optional[float] = None
         self.scheme_handlers = {
             "http": partial(HtmlProoferPlugin.resolve_web_scheme, self),
             "https": partial(HtmlProoferPlugin.resolve_web_scheme, self),
         }
         super().__init__()
 
-    def _get_session(self) -> requests.Session:
-        """Return a per-thread `requests.Session`, creating one lazily if needed."""
-        session = getattr(self._local, 'session', None)
-        if session is None:
-            session = requests.Session()
-            session.verify = False
-            session.headers.update(URL_HEADERS)
-            session.max_redirects = 5
-            self._local.session = session
-        return session
+    def get_checker(self) -> UrlChecker:
+        """Return the configured external URL checker, creating it on first use."""
+        with self._init_lock:
+            if self.checker is None:
+                self.checker = create_checker(
+                    self.config['checker_backend'],
+                    skip_downloads=self.config['skip_downloads'],
+                    timeout=Timeout(self.config['connect_timeout'], self.config['read_timeout']),
+                    headers=URL_HEADERS,
+                    max_connections=self.config['max_connections'],
+                    pool_size_per_host=self.config['pool_size_per_host'],
+                    keep_alive=self.config['keep_alive'],
+                    limiter=HostLimiter(self.config['host_limits']),
+                    probe_method=self.config['probe_method'],
+                )
+            return self.checker
+
+    def get_external_anchors(self) -> ExternalAnchorCache:
+        """Return the cache of external documents whose anchors are checked, creating it on first use."""
+        checker = self.get_checker()
+        with self._init_lock:
+            if self.external_anchors is None:
+                self.external_anchors = ExternalAnchorCache(checker.open_stream, self.config['external_anchor_max_bytes'])
+            return self.external_anchors
+
+    def on_startup(self, *, command: str, dirty: bool) -> None:
+        # Defining this hook keeps the plugin instance alive across `mkdocs serve` rebuilds,
+        # which lets incremental checking reuse the results of the previous build.
+        pass
+
+    def on_config(self, config: Config) -> None:
+        self.files = []
+        self.invalid_links = False
+        self.deferred_urls = {}
+        self.deferred_anchors = []
+        self.page_ids = {}
+        self.pending_pages = []
+        self.checking_pages = []
+        self.close_url_pool()
+        self.persistent_cache = None
+        self._reused_pages = 0
+        self._external_deadline = None
+        self.circuit_breaker = None
+        if self.config['circuit_breaker_threshold'] > 0:
+            self.circuit_breaker = CircuitBreaker(
+                self.config['circuit_breaker_threshold'], self.config['circuit_breaker_cooldown']
+            )
+        self.report = BuildReport()
+        self.ignore_urls_pattern = compile_patterns(self.config['ignore_urls'])
+        self.ignore_pages_pattern = compile_patterns(self.config['ignore_pages'])
+        self.raise_error_excludes = {
+            url_status: compile_patterns(patterns) for url_status, patterns in self.config['raise_error_excludes'].items()
+        }
+        # Relative paths in the options are resolved against the directory of mkdocs.yml.
+        self._config_dir = os.path.dirname(config['config_file_path'] or '')
+
+        # Cached URL statuses outlive a build, so that `mkdocs serve` rebuilds reuse them until they expire.
+        if self.url_cache is not None and (
+            self.url_cache.max_size != self.config['url_cache_size']
+            or self.url_cache.ttl != self.config['url_cache_ttl']
+        ):
+            self.url_cache = None
+        self.get_url_cache().reset_counters()
+
+        # Results of a previous build are only valid with the same options.
+        config_hash = hash(repr(sorted(self.config.items())))
+        if not self.config['incremental'] or config_hash != self._config_hash:
+            self.page_results = {}
+        self._config_hash = config_hash
+
+        if self.config['enabled'] and self.config['cache_dir'] is not None:
+            self.persistent_cache = PersistentUrlCache(
+                os.path.join(self._config_dir, self.config['cache_dir']),
+                self.config['cache_success_ttl'],
+                self.config['cache_failure_ttl'],
+            )
+            self.persistent_cache.load()
+
+        self.close_result_sink()
+        if self.config['enabled'] and self.config['results_file'] is not None:
+            self.result_sink = open_result_sink(
+                os.path.join(self._config_dir, self.config['results_file']), self.config['results_format']
+            )
 
     def on_post_build(self, config: Config) -> None:
+        if self._reused_pages:
+            log_info(f"reused the results of {self._reused_pages} unchanged pages")
+
+        if self.pending_pages:
+            self.check_pending_pages()
+
+        self.collect_checked_pages(wait=True)
+
+        if self.deferred_anchors:
+            self.check_deferred_anchors()
+
+        if self.deferred_urls:
+            self.check_deferred_urls()
+
+        self.close_url_pool()
+
+        if self.url_cache is not None and (self.url_cache.hits or self.url_cache.misses):
+            log_info(f"URL cache: {self.url_cache.hits} hits, {self.url_cache.misses} misses")
+
+        if self.config['performance_report'] is not None:
+            self.write_performance_report()
+
+        if self.persistent_cache is not None:
+            self.persistent_cache.save()
+
+        self.close_checker()
+
+        self.close_result_sink()
+
         if self.config['raise_error_after_finish'] and self.invalid_links:
             raise PluginError("Invalid links present.")
 
+    def on_build_error(self, *, error: Exception) -> None:
+        self.close_page_pool()
+        self.close_url_pool(cancel=True)
+        self.close_checker()
+        self.close_result_sink()
+
+    def close_checker(self) -> None:
+        if self.external_anchors is not None:
+            self.external_anchors.close()
+            self.external_anchors = None
+        if self.checker is not None:
+            self.checker.close()
+            self.checker = None
+
+    def close_result_sink(self) -> None:
+        if self.result_sink is not None:
+            self.result_sink.close()
+            self.result_sink = None
+
     def on_files(self, files: Files, config: Config) -> None:
         # Store files to allow inspecting Markdown files in later stages.
         # The values in files at this point are not guaranteed to be the same as the ones in the Page objects.
         # For example, material blog plugin may modify the files after this event.
         for f in files:
             self.files.append(f)
+        self._file_index = None
+
+    def get_file_index(self) -> FileIndex:
+        """Return the build's file index, creating it on first use."""
+        # At this point, we have all the files, so we can create the index.
+        # Prior to the first page being post-processed, files are still being
+        # updated so creating it earlier would result in incorrect keys.
+        if self._file_index is None:
+            page_ids = self.page_ids if self.config['anchor_source'] == 'html' else None
+            self._file_index = FileIndex(self.files, self.report, page_ids)
+        return self._file_index
 
     def on_post_page(self, output_content: str, page: Page, config: Config) -> None:
         if not self.config['enabled']:
             return
 
-        # Optimization: At this point, we have all the files, so we can create
-        # a dictionary for faster lookups. Prior to this point, files are
-        # still being updated so creating a dictionary before now would result
-        # in incorrect values appearing as the key.
-        opt_files = {}
-        opt_files.update({os.path.normpath(file.url): file for file in self.files})
-        opt_files.update({os.path.normpath(file.src_uri): file for file in self.files})
-
-        # Optimization: only parse links and headings
-        # li, sup are used for footnotes
-        strainer = SoupStrainer(('a', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'sup', 'img'))
+        opt_files = self.get_file_index()
 
         content = output_content if self.config['validate_rendered_template'] else page.content
-        soup = BeautifulSoup(str(content), 'html.parser', parse_only=strainer)
+        src_path = page.file.src_path
+        page_ignored = self.is_page_ignored(src_path)
+        if page_ignored and not self.config['warn_on_ignored_urls']:
+            self.record_page_ids(page, content)
+            return
+        content_hash = None
+        if self.config['incremental']:
+            content_hash = hashlib.blake2b(str(content).encode(), digest_size=16).hexdigest()
+            previous = self.page_results.get(src_path)
+            if previous is not None and self.is_page_result_current(previous, content_hash, opt_files):
+                self.record_page_ids(page, content)
+                self.reuse_page_result(previous, src_path)
+                return
+
+        if self.config['processes']:
+            # Parsing and internal checks happen in a worker process, and the page
+            # is reported in `on_post_build`.
+            future = self.get_page_pool().submit(check_page_links, str(content), src_path)
+            self.pending_pages.append(PendingPage(src_path, page.file.dest_uri, page_ignored, content_hash, future))
+            return
 
-        all_element_ids = set(str(tag['id']) for tag in soup.select('[id]'))
+        # With `anchor_source: html`, fragments can also point to `<a name="...">` anchors of the rendered page.
+        anchor_names = self.config['anchor_source'] == 'html'
+        with self.report.measure('parse'):
+            all_element_ids, urls = extract_links(str(content), self.config['html_parser'], anchor_names)
         all_element_ids.add('')  # Empty anchor is commonly used, but not real
+        if anchor_names:
+            self.page_ids[page.file.dest_uri] = frozenset(all_element_ids)
+
+        self.check_page_urls(
+            urls, src_path, page_ignored, content_hash,
+            lambda url, src_path: self.get_url_status(url, src_path, all_element_ids, opt_files),
+        )
+
+    def is_page_ignored(self, src_path: str) -> bool:
+        return matches_pattern(src_path, self.ignore_pages_pattern)
+
+    def record_page_ids(self, page: Page, content: Optional[str]) -> None:
+        """Keep the element ids of a page that isn't checked, for links from other pages to its anchors."""
+        if self.config['anchor_source'] == 'html':
+            with self.report.measure('parse'):
+                element_ids, _ = extract_links(str(content), self.config['html_parser'], anchor_names=True)
+            element_ids.add('')
+            self.page_ids[page.file.dest_uri] = frozenset(element_ids)
+
+    def check_page_urls(
+            self,
+            urls: Iterable[str],
+            src_path: str,
+            page_ignored: bool,
+            content_hash: Optional[str],
+            get_status: Callable[[str, str], int],
+    ) -> None:
+        """Submit the URLs of a page to the build's worker threads without waiting for them,
+        and report the pages whose checks have completed so far."""
+        urls_to_check, deferred_urls = self.select_urls_to_check(urls, src_path, page_ignored)
+
+        checks = self.submit_urls({url: [src_path] for url in urls_to_check}, get_status)
+        targets: Dict[str, Optional[int]] = {}
+        if content_hash is not None:
+            targets = self.get_link_targets(urls_to_check, src_path, self.get_file_index())
+        self.checking_pages.append(CheckingPage(src_path, content_hash, targets, deferred_urls, checks))
+
+        self.collect_checked_pages(wait=False)
+
+    def collect_checked_pages(self, wait: bool) -> None:
+        """Report the pages whose URLs were checked, in the order they were built, and keep
+        their results for incremental checking.
 
-        urls = (set(str(a['href']) for a in soup.find_all('a', href=True)) |
-                set(str(img['src']) for img in soup.find_all('img')))
+        Unless `wait` is set, this stops at the first page whose checks are still running.
+        """
+        while self.checking_pages:
+            page = self.checking_pages[0]
+            if not wait and not all(future.done() for future in page.checks.futures):
+                return
+            del self.checking_pages[0]
+            invalid_urls = self.collect_urls(page.checks)
+            # Pages with unchecked URLs are checked again on the next build.
+            if page.content_hash is not None and not any(
+                future.result() == UNCHECKED_STATUS for future in page.checks.futures
+            ):
+                self.page_results[page.src_path] = PageCheckResult(
+                    page.content_hash, page.targets, invalid_urls, page.deferred_urls
+                )
+
+    def write_performance_report(self) -> None:
+        """Log a summary of where the build spent its time, and write the full report to a JSON file."""
+        url_cache = self.get_url_cache()
+        report = self.report.as_dict(self.config['performance_report_top'], url_cache.hits, url_cache.misses)
+        for line in self.report.format_summary(report):
+            log_info(line)
+        self.report.write(report, os.path.join(self._config_dir, self.config['performance_report']))
+
+    def get_page_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Return the pool of processes that check pages, starting it on first use."""
+        if self.page_pool is None:
+            # The files are final once the first page is built, so the workers
+            # can share a snapshot of the index for the rest of the build.
+            self.page_pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.config['processes'],
+                initializer=init_page_worker,
+                initargs=(
+                    self.get_file_index().snapshot(),
+                    self.config['html_parser'],
+                    self.config['anchor_source'] == 'html',
+                ),
+            )
+        return self.page_pool
+
+    def close_page_pool(self) -> None:
+        if self.page_pool is not None:
+            self.page_pool.shutdown(cancel_futures=True)
+            self.page_pool = None
+
+    def get_retry_scheduler(self) -> RetryScheduler:
+        """Return the scheduler of URL checks on the build's worker threads, starting them on first use.
+
+        The threads are shared by all pages and deferred URLs, and shut down at the end of the build.
+        """
+        with self._init_lock:
+            if self.retry_scheduler is None:
+                self.url_pool = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.config['max_workers'], thread_name_prefix='htmlproofer'
+                )
+                self.retry_scheduler = RetryScheduler(self.url_pool)
+            return self.retry_scheduler
 
+    def close_url_pool(self, cancel: bool = False) -> None:
+        if self.retry_scheduler is not None:
+            self.retry_scheduler.close()
+            self.retry_scheduler = None
+        if self.url_pool is not None:
+            self.url_pool.shutdown(cancel_futures=cancel)
+            self.url_pool = None
+
+    def check_pending_pages(self) -> None:
+        """Report the pages checked by worker processes, in the order they were built,
+        and check their remaining URLs."""
+        pending_pages, self.pending_pages = self.pending_pages, []
+        try:
+            for src_path, dest_uri, page_ignored, content_hash, future in pending_pages:
+                links = future.result()
+                self.report.add_phase_times(links.phase_times)
+                if self.config['anchor_source'] == 'html':
+                    self.page_ids[dest_uri] = links.element_ids
+                self.check_page_urls(
+                    links.urls, src_path, page_ignored, content_hash, partial(self.get_checked_url_status, links)
+                )
+        finally:
+            self.close_page_pool()
+
+    def get_checked_url_status(self, links: PageLinkStatuses, url: str, src_path: str) -> int:
+        """Return the status of a URL of a page checked by a worker process, which
+        leaves external URLs to be checked here."""
+        url_status = links.internal_statuses.get(url)
+        if url_status is None:
+            return self.get_url_status(url, src_path, set(), {})
+        return self.resolve_internal_status(url, url_status)
+
+    def select_urls_to_check(
+            self,
+            urls: Iterable[str],
+            src_path: str,
+            page_ignored: bool = False,
+    ) -> Tuple[List[str], List[str]]:
+        """Filter out ignored URLs, and set aside the URLs whose check is deferred to the end of
+        the build. Returns the URLs to check now, and the deferred ones."""
         urls_to_check: List[str] = []
+        deferred_urls: List[str] = []
         for url in urls:
-            if any(fnmatch.fnmatch(url, ignore_url) for ignore_url in self.config['ignore_urls']):
+            if page_ignored or matches_pattern(url, self.ignore_urls_pattern):
                 if self.config['warn_on_ignored_urls']:
-                    log_warning(f"ignoring URL {url} from {page.file.src_path}")
-            elif any(
-                fnmatch.fnmatch(page.file.src_path, ignore_page)
-                for ignore_page in self.config['ignore_pages']
-            ):
-                if self.config['warn_on_ignored_urls']:
-                    log_warning(f"ignoring URL {url} from {page.file.src_path}")
+                    log_warning(f"ignoring URL {url} from {src_path}")
+            elif self.config['defer_external_urls'] and self.is_deferrable_url(url):
+                self.deferred_urls.setdefault(url, []).append(src_path)
+                deferred_urls.append(url)
+            elif self.is_cross_page_anchor(url):
+                self.deferred_anchors.append((url, src_path))
+                deferred_urls.append(url)
             else:
                 urls_to_check.append(url)
+        return urls_to_check, deferred_urls
 
-        # Note on exception propagation: `future.result()` re-raises any exception
-        # from a worker thread. If `raise_error` is `True` and multiple URLs fail
-        # concurrently, only the first exception to be observed here will propagate;
-        # remaining futures continue to execute but their exceptions are not raised.
-        # This is acceptable because each thread independently logs/reports its
-        # failure via `report_invalid_url` before raising, so no errors are silently
-        # lost. When `raise_error_after_finish` is used instead, all failures are
-        # recorded via the `invalid_links` flag and surfaced in `on_post_build`.
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.config['max_workers']) as executor:
-            for future in concurrent.futures.as_completed(
-                executor.submit(self.check_url, url, page.file.src_path, all_element_ids, opt_files) for url in urls_to_check
-            ):
-                future.result()
+    @staticmethod
+    def is_page_result_current(result: PageCheckResult, content_hash: str, files: FileIndex) -> bool:
+        """Whether neither the page nor any of the files it links to changed since the result."""
+        return result.content_hash == content_hash and all(
+            files.get_fingerprint(search_path) == fingerprint
+            for search_path, fingerprint in result.targets.items()
+        )
+
+    def reuse_page_result(self, result: PageCheckResult, src_path: str) -> None:
+        """Report the invalid URLs of an unchanged page again, without rechecking them."""
+        self._reused_pages += 1
+        for url, url_status in result.invalid_urls.items():
+            self.report_invalid_url(url, url_status, src_path)
+        for url in result.deferred_urls:
+            if self.is_cross_page_anchor(url):
+                self.deferred_anchors.append((url, src_path))
+            else:
+                self.deferred_urls.setdefault(url, []).append(src_path)
+
+    @staticmethod
+    def get_link_targets(urls: Iterable[str], src_path: str, files: FileIndex) -> Dict[str, Optional[int]]:
+        """Fingerprint the files that the page's internal links resolve to."""
+        targets = {}
+        for url in urls:
+            scheme, _, path, _, _ = urllib.parse.urlsplit(url)
+            match = MARKDOWN_ANCHOR_PATTERN.match(url)
+            if scheme or not path or match is None:
+                continue
+            search_path = HtmlProoferPlugin.resolve_search_path(match.group(1), src_path, files)
+            if search_path is not None:
+                targets[search_path] = files.get_fingerprint(search_path)
+        return targets
+
+    def is_deferrable_url(self, url: str) -> bool:
+        """Whether the URL is an external URL whose check can be deferred to the end of the build."""
+        if not self.config['validate_external_urls'] or any(pat.match(url) for pat in LOCAL_PATTERNS):
+            return False
+        return urllib.parse.urlsplit(url).scheme in self.scheme_handlers
+
+    def is_cross_page_anchor(self, url: str) -> bool:
+        """Whether the URL links to an anchor of another page, which is checked against the
+        rendered pages once they have all been built."""
+        if self.config['anchor_source'] != 'html':
+            return False
+        scheme, _, path, _, fragment = urllib.parse.urlsplit(url)
+        return not scheme and bool(path) and bool(fragment)
+
+    def check_deferred_anchors(self) -> None:
+        """Check the links to anchors of other pages against the element ids of the rendered pages."""
+        deferred_anchors, self.deferred_anchors = self.deferred_anchors, []
+        files = self.get_file_index()
+        urls: Dict[str, List[str]] = {}
+        for url, src_path in deferred_anchors:
+            urls.setdefault(url, []).append(src_path)
+        self.report.record_urls(urls)
+
+        for url, src_path in deferred_anchors:
+            start = time.perf_counter()
+            with self.report.measure('internal'):
+                url_status = self.get_internal_url_status(url, src_path, set(), files)
+            url_status = self.resolve_internal_status(url, url_status)
+            self.report_url_status(url, [src_path], url_status, time.perf_counter() - start, False)
+
+    def check_deferred_urls(self) -> None:
+        """Check every unique deferred external URL in one concurrent batch, and
+        report each failure for every page that references the URL."""
+        deferred_urls, self.deferred_urls = self.deferred_urls, {}
+        unique_urls = {self.canonicalize_url(url) for url in deferred_urls}
+        log_info(f"checking {len(unique_urls)} unique external URLs...")
+
+        self.check_urls(deferred_urls, lambda url, src_path: self.get_url_status(url, src_path, set(), {}))
+
+    def check_urls(self, urls: Dict[str, List[str]], get_status: Callable[[str, str], int]) -> Dict[str, int]:
+        """Check URLs concurrently, and report each failure for every page (source path)
+        that references the URL. Returns the reported URLs with their status."""
+        return self.collect_urls(self.submit_urls(urls, get_status))
+
+    def submit_urls(self, urls: Dict[str, List[str]], get_status: Callable[[str, str], int]) -> UrlChecks:
+        """Submit checks of the URLs to the build's worker threads.
+
+        Transient failures are retried by the `RetryScheduler`, so that waiting for a
+        retry, or for a throttled host to allow a request, doesn't hold up a worker thread.
+        With the `asyncio` checker, external URLs are checked by tasks of its event loop
+        instead, so that the number of requests in flight isn't bounded by the threads.
+        """
+        self.report.record_urls(urls)
+        self.expect_external_anchors(urls)
+        scheduler = self.get_retry_scheduler()
+        latencies: Dict[str, Tuple[float, bool]] = {}
+        futures: 'Dict[concurrent.futures.Future[int], str]' = {}
+        for url, src_paths in urls.items():
+            if self.is_checked_on_loop(url):
+                checker = cast(AsyncioChecker, self.get_checker())
+                future = checker.submit(self.check_url_async(url, src_paths[0], latencies))
+            else:
+                future = scheduler.submit(
+                    partial(self.get_timed_status, get_status, latencies, url, src_paths[0]),
+                    partial(self.get_retry_delay, url, src_paths[0]),
+                )
+            futures[future] = url
+        return UrlChecks(urls, futures, latencies)
+
+    def expect_external_anchors(self, urls: Iterable[str]) -> None:
+        """Announce the anchors of the external URLs about to be checked, so that the response
+        of each document is closed as soon as all of its anchors have been found."""
+        if not self.config['validate_external_anchors'] or not self.config['validate_external_urls']:
+            return
+        anchor_urls = [
+            self.canonicalize_url(url) for url in urls
+            if urllib.parse.urlsplit(url).scheme in ('http', 'https') and urllib.parse.urlsplit(url).fragment
+        ]
+        if anchor_urls:
+            self.get_external_anchors().expect(anchor_urls)
+
+    def is_checked_on_loop(self, url: str) -> bool:
+        """Whether the URL is an external URL that the `asyncio` checker checks as a task of
+        its event loop, rather than on a worker thread."""
+        if self.config['checker_backend'] != 'asyncio' or not self.config['validate_external_urls']:
+            return False
+        if any(pat.match(url) for pat in LOCAL_PATTERNS):
+            return False
+        scheme, _, _, _, fragment = urllib.parse.urlsplit(url)
+        # The documents of external anchors are parsed as they stream in, on the worker threads.
+        return scheme in ('http', 'https') and not (fragment and self.config['validate_external_anchors'])
+
+    def collect_urls(self, checks: UrlChecks) -> Dict[str, int]:
+        """Wait for submitted URL checks, and report each failure for every page (source path)
+        that references the URL. Returns the reported URLs with their status."""
+        # Note on exception propagation: failures are reported from this thread as
+        # their checks complete. If `raise_error` is `True`, the first reported
+        # failure propagates and the remaining checks are abandoned. When
+        # `raise_error_after_finish` is used instead, all failures are recorded via
+        # the `invalid_links` flag and surfaced in `on_post_build`.
+        invalid_urls = {}
+        for future in concurrent.futures.as_completed(checks.futures):
+            url = checks.futures[future]
+            url_status = future.result()
+            latency, from_cache = checks.latencies[url]
+            if self.report_url_status(url, checks.urls[url], url_status, latency, from_cache):
+                invalid_urls[url] = url_status
+        return invalid_urls
+
+    def report_url_status(
+            self,
+            url: str,
+            src_paths: List[str],
+            url_status: int,
+            latency: float,
+            from_cache: bool,
+    ) -> bool:
+        """Record the status of a checked URL for every page (source path) that references it,
+        and report it if it's invalid. Returns whether it's invalid."""
+        invalid = self.bad_url(url_status) and self.is_error(url, url_status)
+        if self.result_sink is not None:
+            for src_path in src_paths:
+                self.result_sink.write(LinkResult(url, src_path, url_status, latency, from_cache, invalid))
+        if invalid:
+            for src_path in src_paths:
+                self.report_invalid_url(url, url_status, src_path)
+        elif url_status == UNCHECKED_STATUS:
+            for src_path in src_paths:
+                log_warning(f'unchecked url - {url} [{src_path}]: external_check_budget exceeded')
+        return invalid
+
+    def get_timed_status(
+            self,
+            get_status: Callable[[str, str], int],
+            latencies: Dict[str, Tuple[float, bool]],
+            url: str,
+            src_path: str,
+    ) -> int:
+        """Get the status of the URL, recording how long it took and whether it came from a cache."""
+        _from_cache.set(False)
+        start = time.perf_counter()
+        url_status = get_status(url, src_path)
+        latencies[url] = (time.perf_counter() - start, _from_cache.get())
+        return url_status
+
+    async def check_url_async(self, url: str, src_path: str, latencies: Dict[str, Tuple[float, bool]]) -> int:
+        """Check an external URL as a task of the `asyncio` checker's event loop, waiting
+        there for its retries, and record how long its last attempt took."""
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            url_status = await self.resolve_web_scheme_async(url)
+            latencies[url] = (time.perf_counter() - start, _from_cache.get())
+            delay = self.get_retry_delay(url, src_path, url_status, attempt)
+            if delay is None:
+                return url_status
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def get_retry_delay(self, url: str, src_path: str, url_status: int, attempt: int) -> Optional[float]:
+        """Return how long to wait before checking the URL again, or None if it
+        shouldn't be retried."""
+        if (
+            attempt >= self.config['retry_max_times']
+            or not self.is_transient_status(url_status)
+            or not self.is_error(url, url_status)
+        ):
+            return None
+        # Exponential backoff, with jitter to spread out retries to the same host.
+        retry_duration = RETRY_BASE_DELAY * 2 ** attempt
+        retry_duration += random.uniform(0, retry_duration / 4)
+        deadline = self.get_external_deadline()
+        if deadline is not None:
+            # Retries due after the `external_check_budget` runs out find it exhausted right away.
+            retry_duration = max(0.0, min(retry_duration, deadline - time.monotonic()))
+        log_info(f"Retrying URL {url} from {src_path} after {retry_duration:.1f} seconds...")
+        self.report.record_retry()
+        # The failure was cached, but the retry should request the URL again.
+        url = self.canonicalize_url(url)
+        if self.url_cache is not None:
+            self.url_cache.discard(url)
+        if self.persistent_cache is not None:
+            self.persistent_cache.discard(url)
+        if self.external_anchors is not None and urllib.parse.urlsplit(url).fragment:
+            self.external_anchors.discard(url)
+        return retry_duration
 
     def report_invalid_url(self, url, url_status, src_path):
         error = f'invalid url - {url} [{url_status}] [{src_path}]'
@@ -179,44 +980,143 @@ class HtmlProoferPlugin(BasePlugin):
             log_info(f'Unknown url-scheme "{scheme}:" detected. "{url}" from "{src_path}" will not be checked.')
         return 0
 
-    @lru_cache(maxsize=1000)
+    def get_url_cache(self) -> UrlResultCache:
+        """Return the cache of external URL statuses, creating it on first use."""
+        with self._init_lock:
+            if self.url_cache is None:
+                self.url_cache = UrlResultCache(self.config['url_cache_size'], self.config['url_cache_ttl'])
+            return self.url_cache
+
+    def canonicalize_url(self, url: str) -> str:
+        """Return the canonical form of an external URL. Fragments are kept when they are
+        validated, in which case the document is still fetched once for all of them."""
+        return canonicalize_url(url, self.config['validate_external_anchors'], self.config['sort_query_params'])
+
     def resolve_web_scheme(self, url: str) -> int:
+        # Links whose URLs only differ in ways that don't change the request share its result.
+        url = self.canonicalize_url(url)
+        # Cleared by `check_web_url` if the URL is requested
+        _from_cache.set(True)
+        url_cache = self.get_url_cache()
+        status = url_cache.get_or_fetch(url, partial(self.check_web_url, url))
+        if status in (UNCHECKED_STATUS, HOST_DOWN_STATUS):
+            url_cache.discard(url)
+        return status
+
+    async def resolve_web_scheme_async(self, url: str) -> int:
+        """Like `resolve_web_scheme`, on the `asyncio` checker's event loop."""
+        url = self.canonicalize_url(url)
+        _from_cache.set(True)
+        url_cache = self.get_url_cache()
+        status = await url_cache.get_or_fetch_async(url, partial(self.check_web_url_async, url))
+        if status in (UNCHECKED_STATUS, HOST_DOWN_STATUS):
+            url_cache.discard(url)
+        return status
+
+    def check_web_url(self, url: str) -> int:
+        """Return the status of the URL from the persistent cache, or by requesting it."""
+        host = UrlChecker.get_host(url)
+        status = self.get_unrequested_status(url, host)
+        if status is not None:
+            return status
+
+        _from_cache.set(False)
+        start = time.perf_counter()
         try:
-            response = self._get_session().get(url, timeout=URL_TIMEOUT, stream=True)
-
-            if self.config['skip_downloads'] is False:
-                # Download the entire contents as to not break previous behaviour.
-                for _ in response.iter_content(chunk_size=1024 * 1024):
-                    pass
-
-            return response.status_code
-        except requests.exceptions.Timeout:
-            return 504
-        except requests.exceptions.TooManyRedirects:
-            return -1
-        except requests.exceptions.ConnectionError:
-            return -1
-
-    def check_url(
-            self,
-            url: str,
-            src_path: str,
-            all_element_ids: Set[str],
-            files: Dict[str, File],
-            ) -> None:
-        retry_times = 0
-        retry_max_times = self.config['retry_max_times']
-        retry_duration = 2
-        while retry_times <= retry_max_times:
-            url_status = self.get_url_status(url, src_path, all_element_ids, files)
-            retry_times += 1
-            if self.bad_url(url_status) and self.is_error(self.config, url, url_status):
-                if retry_times > retry_max_times:
-                    self.report_invalid_url(url, url_status, src_path)
-                else:
-                    log_info(f"Retrying URL {url} from {src_path} after {retry_duration} seconds...")
-                    time.sleep(retry_duration)
-                    retry_duration *= 2
+            status, final_url = self.fetch_web_url(url, self.get_external_deadline())
+        except (HostThrottled, DeadlineExceeded) as e:
+            # The URL wasn't requested: it's checked again once its host allows it, or not
+            # at all if the `external_check_budget` runs out first.
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.cancel(host)
+            if isinstance(e, HostThrottled):
+                raise
+            status = UNCHECKED_STATUS
+        else:
+            self.record_web_url(url, host, status, final_url, time.perf_counter() - start)
+        self.record_persistent_cache_miss()
+        return status
+
+    async def check_web_url_async(self, url: str) -> int:
+        """Like `check_web_url`, requesting the URL on the `asyncio` checker's event loop."""
+        host = UrlChecker.get_host(url)
+        status = self.get_unrequested_status(url, host)
+        if status is not None:
+            return status
+
+        checker = cast(AsyncioChecker, self.get_checker())
+        _from_cache.set(False)
+        start = time.perf_counter()
+        try:
+            status, final_url = await checker.fetch_async(url, self.get_external_deadline())
+        except DeadlineExceeded:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.cancel(host)
+            status = UNCHECKED_STATUS
+        else:
+            self.record_web_url(url, host, status, final_url, time.perf_counter() - start)
+        self.record_persistent_cache_miss()
+        return status
+
+    def get_unrequested_status(self, url: str, host: str) -> Optional[int]:
+        """Return the status of the URL if it isn't to be requested: when it's in the persistent
+        cache, the `external_check_budget` ran out or the host's circuit breaker is open.
+
+        Misses of the persistent cache are left to be recorded once the URL is requested,
+        as checks of throttled hosts look it up again.
+        """
+        if self.persistent_cache is not None:
+            cached = self.persistent_cache.get(url)
+            if cached is not None:
+                self.report.record_persistent_cache_lookup(True)
+                return cached.status
+
+        deadline = self.get_external_deadline()
+        if deadline is not None and time.monotonic() > deadline:
+            status = UNCHECKED_STATUS
+        elif self.circuit_breaker is not None and not self.circuit_breaker.allow(host):
+            status = HOST_DOWN_STATUS
+        else:
+            return None
+        self.record_persistent_cache_miss()
+        return status
+
+    def record_persistent_cache_miss(self) -> None:
+        if self.persistent_cache is not None:
+            self.report.record_persistent_cache_lookup(False)
+
+    def record_web_url(self, url: str, host: str, status: int, final_url: str, seconds: float) -> None:
+        """Record the outcome of a request to the URL in the report, circuit breaker and persistent cache."""
+        self.report.record_fetch(url, seconds)
+        if self.circuit_breaker is not None and self.circuit_breaker.record(host, status in (-1, 504)):
+            log_warning(
+                f"{host} failed {self.config['circuit_breaker_threshold']} times in a row, "
+                f"its remaining URLs fail with status {HOST_DOWN_STATUS}"
+            )
+        if self.persistent_cache is not None:
+            self.persistent_cache.set(url, status, final_url)
+
+    def get_external_deadline(self) -> Optional[float]:
+        """Return when (in `time.monotonic()` seconds) the `external_check_budget` runs out, if it's set,
+        counting from the build's first external request."""
+        budget = self.config['external_check_budget']
+        if budget is None:
+            return None
+        with self._init_lock:
+            if self._external_deadline is None:
+                self._external_deadline = time.monotonic() + budget
+            return self._external_deadline
+
+    def fetch_web_url(self, url: str, deadline: Optional[float] = None) -> Tuple[int, str]:
+        """Request the URL, returning its status and the final URL after redirects.
+
+        With `validate_external_anchors`, the document of a URL with a fragment is streamed
+        until the anchor is found, and a missing anchor is reported as 404.
+        """
+        if self.config['validate_external_anchors'] and urllib.parse.urlsplit(url).fragment:
+            status, final_url, has_anchor = self.get_external_anchors().check(url, deadline)
+            return (404 if has_anchor is False else status), final_url
+        return self.get_checker().fetch(url, deadline)
 
     def get_url_status(
             self,
@@ -228,20 +1128,30 @@ class HtmlProoferPlugin(BasePlugin):
         if any(pat.match(url) for pat in LOCAL_PATTERNS):
             return 0
 
-        scheme, _, path, _, fragment = urllib.parse.urlsplit(url)
+        scheme = urllib.parse.urlsplit(url).scheme
         if scheme:
             if self.config['validate_external_urls']:
                 return self.get_external_url(url, scheme, src_path)
             return 0
+        with self.report.measure('internal'):
+            url_status = self.get_internal_url_status(url, src_path, all_element_ids, files)
+        return self.resolve_internal_status(url, url_status)
+
+    @staticmethod
+    def get_internal_url_status(url: str, src_path: str, all_element_ids: Set[str], files: Dict[str, File]) -> int:
+        """Check a link within the site against the ids of its page or the site's files."""
+        _, _, path, _, fragment = urllib.parse.urlsplit(url)
         if fragment and not path:
             return 0 if url[1:] in all_element_ids else 404
-        else:
-            is_valid = self.is_url_target_valid(url, src_path, files)
-            url_status = 404
-            if not is_valid and self.is_error(self.config, url, url_status):
-                log_warning(f"Unable to locate source file for: {url}")
-                return url_status
-            return 0
+        return 0 if HtmlProoferPlugin.is_url_target_valid(url, src_path, files) else 404
+
+    def resolve_internal_status(self, url: str, url_status: int) -> int:
+        """Warn about a link to a file that can't be located, unless its failure is excluded."""
+        if url_status and urllib.parse.urlsplit(url).path:
+            if not self.is_error(url, url_status):
+                return 0
+            log_warning(f"Unable to locate source file for: {url}")
+        return url_status
 
     @staticmethod
     def is_url_target_valid(url: str, src_path: str, files: Dict[str, File]) -> bool:
@@ -250,18 +1160,28 @@ class HtmlProoferPlugin(BasePlugin):
             return True
 
         url_target, _, optional_anchor = match.groups()
+        if isinstance(files, FileIndex):
+            search_path = HtmlProoferPlugin.resolve_search_path(url_target, src_path, files)
+            return search_path is not None and files.is_target_valid(search_path, optional_anchor)
+
         source_file = HtmlProoferPlugin.find_source_file(url_target, src_path, files)
-        if source_file is None:
-            return False
+        return source_file is not None and HtmlProoferPlugin.is_anchor_valid(source_file, optional_anchor, files)
 
+    @staticmethod
+    def is_anchor_valid(source_file: File, optional_anchor: Optional[str], files: Dict[str, File]) -> bool:
+        """Whether the file a link resolves to has the link's anchor, if any."""
         # If there's an anchor (fragment) on the link, we try to find it in the source_file
         if optional_anchor:
             _, extension = os.path.splitext(source_file.src_uri)
             # Currently only Markdown-based pages are supported, but conceptually others could be added below
             if extension == ".md":
-                if source_file.page is None or source_file.page.markdown is None:
-                    return False
-                if not HtmlProoferPlugin.contains_anchor(source_file.page.markdown, optional_anchor):
+                if isinstance(files, FileIndex):
+                    anchors = files.get_anchors(source_file)
+                elif source_file.page is None or source_file.page.markdown is None:
+                    anchors = None
+                else:
+                    anchors = HtmlProoferPlugin.get_anchors(source_file.page.markdown)
+                if anchors is None or optional_anchor not in anchors:
                     return False
 
         return True
@@ -279,6 +1199,15 @@ class HtmlProoferPlugin(BasePlugin):
     def find_source_file(url: str, src_path: str, files: Dict[str, File]) -> Optional[File]:
         """From a built URL, find the original file from the project that built it."""
 
+        search_path = HtmlProoferPlugin.resolve_search_path(url, src_path, files)
+        if search_path is None:
+            return None
+        return files.get(search_path)
+
+    @staticmethod
+    def resolve_search_path(url: str, src_path: str, files: Dict[str, File]) -> Optional[str]:
+        """From a built URL, find the key under which its file is looked up in `files`."""
+
         if len(url) > 1 and url[0] == '/':
             # Convert root/site paths
             search_path = os.path.normpath(url[1:])
@@ -286,21 +1215,26 @@ class HtmlProoferPlugin(BasePlugin):
             # Handle relative links by looking up the destination url for the
             # src_path and getting the parent directory.
             try:
-                dest_uri = files[src_path].dest_uri
-                src_dir = urllib.parse.quote(str(pathlib.Path(dest_uri).parent), safe='/\\')
-                search_path = os.path.normpath(str(pathlib.Path(src_dir) / pathlib.Path(url)))
+                if isinstance(files, FileIndex):
+                    src_dir = files.dest_dirs[src_path]
+                else:
+                    dest_uri = files[src_path].dest_uri
+                    src_dir = urllib.parse.quote(str(pathlib.Path(dest_uri).parent), safe='/\\')
             except KeyError:
                 return None
-
-        try:
-            return files[search_path]
-        except KeyError:
-            return None
+            search_path = os.path.normpath(os.path.join(src_dir, url))
+        return search_path
 
     @staticmethod
     def contains_anchor(markdown: str, anchor: str) -> bool:
         """Check if a set of Markdown source text contains a heading that corresponds to a
         given anchor."""
+        return anchor in HtmlProoferPlugin.get_anchors(markdown)
+
+    @staticmethod
+    def get_anchors(markdown: str) -> FrozenSet[str]:
+        """Collect every anchor that a set of Markdown source text can be linked to."""
+        anchors: Set[str] = set()
         for line in markdown.splitlines():
             # Markdown allows whitespace before headers and an arbitrary number of #'s.
             heading_match = HEADING_PATTERN.match(line)
@@ -313,12 +1247,7 @@ class HtmlProoferPlugin(BasePlugin):
                 # # Heading {.testclass #testanchor}
                 # # Heading {.testclass}
                 # these can override the headings anchor id, or alternatively just provide additional class etc.
-                attr_list_anchor_match = ATTRLIST_ANCHOR_PATTERN.match(heading)
-                if attr_list_anchor_match is not None:
-                    attr_list_anchor = heading_match.groups()[1]
-                    if anchor == attr_list_anchor:
-                        return True
-
+                # The overriding anchors are gathered with the other attribute lists of the line below.
                 heading = re.sub(ATTRLIST_PATTERN, '', heading)  # remove any attribute list from heading, before slugify
 
                 # Headings are allowed to have images after them, of the form:
@@ -330,38 +1259,32 @@ class HtmlProoferPlugin(BasePlugin):
                 # https://squidfunk.github.io/mkdocs-material/setup/extensions/python-markdown-extensions/#emoji
                 heading = re.sub(EMOJI_PATTERN, '', heading)
 
-                anchor_slug = slugify(heading, '-')
-                if anchor == anchor_slug:
-                    return True
+                anchors.add(slugify(heading, '-'))
 
             # Check for HTML anchors using id or name attributes
             # Multiple anchors can exist on a single line, so find all of them
-            for html_anchor in re.findall(HTML_LINK_PATTERN, line):
-                if anchor == html_anchor:
-                    return True
+            anchors.update(re.findall(HTML_LINK_PATTERN, line))
 
             # Any attribute list at end of paragraphs or after images can also generate an anchor (in addition to
             # the heading ones) so gather those and check as well (multiple could be a line so gather all)
-            for attr_list_anchor in re.findall(ATTRLIST_ANCHOR_PATTERN, line):
-                if anchor == attr_list_anchor:
-                    return True
+            anchors.update(re.findall(ATTRLIST_ANCHOR_PATTERN, line))
+
+        return frozenset(anchors)
 
-        return False
+    @staticmethod
+    def is_transient_status(url_status: int) -> bool:
+        """Whether a failure may go away on retry: connection failures, timeouts,
+        throttling (429) and server errors (5xx)."""
+        return url_status == -1 or url_status == 429 or 500 <= url_status < 600
 
     @staticmethod
     def bad_url(url_status: int) -> bool:
-        if url_status == -1:
+        if url_status == -1 or url_status == HOST_DOWN_STATUS:
             return True
         elif url_status >= 400:
             return True
         else:
             return False
 
-    @staticmethod
-    def is_error(config: Config, url: str, url_status: int) -> bool:
-        excludes = config['raise_error_excludes'].get(url_status, [])
-
-        if any(fnmatch.fnmatch(url, exclude_url) for exclude_url in excludes):
-            return False
-        else:
-            return True
+    def is_error(self, url: str, url_status: int) -> bool:
+        return not matches_pattern(url, self.raise_error_excludes.get(url_status))
@@ -0,0 +1,293 @@
+import asyncio
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+import email.utils
+import fnmatch
+import threading
+import time
+from typing import AsyncIterator, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from mkdocs.exceptions import PluginError
+
+# How long to wait before polling again for a free concurrency slot.
+POLL_INTERVAL = 0.05
+# How long a check waiting for a concurrency slot waits at most before trying again, in case
+# the release it was woken by went to a check that no longer needed a request.
+MAX_PARK_TIME = 1.0
+# Upper bound on how long a `Retry-After` header may pause a host.
+MAX_RETRY_AFTER = 120.0
+
+
+class HostLimit(NamedTuple):
+    max_concurrency: Optional[int] = None
+    rate: Optional[float] = None  # requests per second
+    # Override the checker's timeouts (seconds) for the host
+    connect_timeout: Optional[float] = None
+    read_timeout: Optional[float] = None
+
+
+class HostThrottled(Exception):
+    """Raised instead of waiting for a request slot, when the limits of a host don't allow
+    a request yet. `delay` is how long (in seconds) to wait before trying again.
+
+    When the host is at its `max_concurrency`, `released` is set to a future that is
+    resolved as soon as one of the host's requests ends, or cancelled if the check was
+    tried again (after `delay`) before that.
+    """
+
+    def __init__(self, host: str, delay: float, released: 'Optional[Future[None]]' = None):
+        super().__init__(f"requests to {host} are held back for {delay:.2f}s")
+        self.host = host
+        self.delay = delay
+        self.released = released
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request can't be made before its deadline."""
+
+
+class _HostState:
+    def __init__(self, limit: HostLimit):
+        self.limit = limit
+        self.active = 0
+        self.tokens = max(1.0, limit.rate or 0.0)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        # Checks waiting for a request to the host to end, in the order they were throttled
+        self.waiters: 'Deque[Future[None]]' = deque()
+
+
+def parse_host_limits(host_limits: Dict[str, Dict]) -> List[Tuple[str, HostLimit]]:
+    """Validate the `host_limits` option, a mapping of glob host patterns to limits."""
+    parsed = []
+    for pattern, options in host_limits.items():
+        options = options or {}
+        unknown = set(options) - set(HostLimit._fields)
+        if unknown:
+            raise PluginError(f"Unknown host_limits option(s) for '{pattern}': {', '.join(sorted(unknown))}")
+        limit = HostLimit(**options)
+        if limit.max_concurrency is not None and limit.max_concurrency < 1:
+            raise PluginError(f"host_limits max_concurrency for '{pattern}' must be at least 1")
+        for name in ('rate', 'connect_timeout', 'read_timeout'):
+            value = getattr(limit, name)
+            if value is not None and value <= 0:
+                raise PluginError(f"host_limits {name} for '{pattern}' must be positive")
+        parsed.append((str(pattern).lower(), limit))
+    return parsed
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds requested by a `Retry-After` header, if any."""
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        delay = date.timestamp() - time.time()
+    return min(max(delay, 0.0), MAX_RETRY_AFTER)
+
+
+def check_deadline(deadline: Optional[float], delay: float = 0.0) -> Optional[float]:
+    """Return how many seconds are left before the deadline (in `time.monotonic()` seconds),
+    if any, once the delay has passed. Raises `DeadlineExceeded` if there are none left."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic() - delay
+    if remaining <= 0:
+        raise DeadlineExceeded()
+    return remaining
+
+
+class HostLimiter:
+    """Per-host concurrency caps, token-bucket rate limits and timeouts for external requests.
+
+    Limits are looked up by the first matching glob host pattern. Hosts can also be
+    paused, e.g. when a server responds with `Retry-After`, whether or not they are
+    limited. Throttling one host never delays requests to other hosts: threads aren't
+    made to wait for a slot, but are told how long to wait by `HostThrottled`, or to wait
+    for a request to a host at its `max_concurrency` to end.
+    """
+
+    def __init__(self, host_limits: Optional[Dict[str, Dict]] = None):
+        self._patterns = parse_host_limits(host_limits or {})
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def get_limit(self, host: str) -> HostLimit:
+        """Return the limits that apply to the host."""
+        with self._lock:
+            return self._state(host.lower()).limit
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            limit = next(
+                (limit for pattern, limit in self._patterns if fnmatch.fnmatchcase(host, pattern)),
+                HostLimit(),
+            )
+            state = self._hosts[host] = _HostState(limit)
+        return state
+
+    def try_acquire(self, host: str) -> float:
+        """Take a request slot for the host, returning 0, or how long to wait before trying again."""
+        delay, _ = self._acquire(host, wait=False)
+        return delay
+
+    def _acquire(self, host: str, wait: bool) -> 'Tuple[float, Optional[Future[None]]]':
+        """Like `try_acquire`, also returning a future resolved once a request slot is released
+        if `wait` is set and the host is at its `max_concurrency`."""
+        host = host.lower()
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            if state.paused_until > now:
+                return state.paused_until - now, None
+
+            limit = state.limit
+            if limit.max_concurrency is not None and state.active >= limit.max_concurrency:
+                if not wait:
+                    return POLL_INTERVAL, None
+                released: 'Future[None]' = Future()
+                state.waiters.append(released)
+                return MAX_PARK_TIME, released
+
+            if limit.rate is not None:
+                state.tokens = min(max(1.0, limit.rate), state.tokens + (now - state.updated) * limit.rate)
+                state.updated = now
+                if state.tokens < 1.0:
+                    return (1.0 - state.tokens) / limit.rate, None
+                state.tokens -= 1.0
+
+            state.active += 1
+            return 0.0, None
+
+    def release(self, host: str) -> None:
+        """Give back a request slot of the host, waking the first check waiting for one."""
+        with self._lock:
+            state = self._state(host.lower())
+            state.active -= 1
+            waiter = None
+            while state.waiters:
+                waiter = state.waiters.popleft()
+                # Skip the checks that were already tried again.
+                if waiter.set_running_or_notify_cancel():
+                    break
+                waiter = None
+        if waiter is not None:
+            waiter.set_result(None)
+
+    def pause(self, host: str, seconds: float) -> None:
+        """Hold back new requests to the host for the given number of seconds."""
+        with self._lock:
+            state = self._state(host.lower())
+            state.paused_until = max(state.paused_until, time.monotonic() + seconds)
+
+    @contextmanager
+    def slot(self, host: str, deadline: Optional[float] = None) -> Iterator[None]:
+        """Take a request slot for the host without blocking the current thread, raising
+        `HostThrottled` if a request to the host isn't allowed yet.
+
+        Raises `DeadlineExceeded` instead if it wouldn't be allowed before the deadline
+        (in `time.monotonic()` seconds).
+        """
+        delay, released = self._acquire(host, wait=True)
+        if delay:
+            try:
+                # A slot may be released at any time, so only the pauses and rate limits count.
+                check_deadline(deadline, 0.0 if released is not None else delay)
+            except DeadlineExceeded:
+                if released is not None:
+                    released.cancel()
+                raise
+            raise HostThrottled(host, delay, released)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    @asynccontextmanager
+    async def async_slot(self, host: str, deadline: Optional[float] = None) -> AsyncIterator[None]:
+        """Wait on the event loop until a request to the host is allowed, raising
+        `DeadlineExceeded` if it wouldn't be allowed before the deadline."""
+        while True:
+            delay = self.try_acquire(host)
+            if not delay:
+                break
+            check_deadline(deadline, delay)
+            await asyncio.sleep(delay)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    def observe(self, host: str, status: int, retry_after: Optional[str]) -> None:
+        """Honour the `Retry-After` header of a throttled (429) or unavailable (503) response."""
+        if status in (429, 503):
+            delay = parse_retry_after(retry_after)
+            if delay:
+                self.pause(host, delay)
+
+
+class _CircuitState:
+    def __init__(self) -> None:
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker, to stop requesting hosts that are down or unreachable.
+
+    After `threshold` consecutive failures of requests to a host, the host's circuit
+    opens and `allow` refuses further requests to it. With a `cooldown` (seconds),
+    a single request is then allowed through once the cooldown has passed: the circuit
+    closes again if it succeeds, and reopens for another cooldown otherwise.
+    """
+
+    def __init__(self, threshold: int, cooldown: Optional[float] = None):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._hosts: Dict[str, _CircuitState] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, host: str) -> bool:
+        """Whether a request to the host may be made."""
+        with self._lock:
+            state = self._hosts.setdefault(host.lower(), _CircuitState())
+            if state.opened_at is None:
+                return True
+            if self.cooldown is not None and not state.probing and time.monotonic() - state.opened_at >= self.cooldown:
+                state.probing = True
+                return True
+            return False
+
+    def cancel(self, host: str) -> None:
+        """Forget a request that was allowed but couldn't be made, so that another one can probe the host."""
+        with self._lock:
+            state = self._hosts.get(host.lower())
+            if state is not None:
+                state.probing = False
+
+    def record(self, host: str, failed: bool) -> bool:
+        """Record the outcome of a request to the host. Returns whether the host's circuit just opened."""
+        with self._lock:
+            state = self._hosts.setdefault(host.lower(), _CircuitState())
+            if not failed:
+                state.failures = 0
+                state.opened_at = None
+                state.probing = False
+                return False
+
+            state.failures += 1
+            if state.probing:
+                state.probing = False
+                state.opened_at = time.monotonic()
+            elif state.opened_at is None and state.failures >= self.threshold:
+                state.opened_at = time.monotonic()
+                return True
+            return False
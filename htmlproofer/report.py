@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+import json
+import os.path
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Mapping, Set, Tuple
+import urllib.parse
+
+PHASES = ('parse', 'internal', 'anchors', 'external')
+
+
+class BuildReport:
+    """Collects where link checking spends its time during a build.
+
+    Phase times are cumulative over all threads and worker processes, so they can
+    add up to more than the build took. Each phase only counts its own time: time
+    spent in a phase that is measured within another one isn't counted twice.
+    """
+
+    def __init__(self) -> None:
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        # Time spent requesting each external URL, including retries
+        self.fetch_times: Dict[str, float] = {}
+        self.retries = 0
+        self.total_urls = 0
+        self.unique_urls: Set[str] = set()
+        self.persistent_cache_hits = 0
+        self.persistent_cache_misses = 0
+        self._lock = threading.Lock()
+        # Time measured by `measure` on each thread, to exclude it from enclosing phases
+        self._local = threading.local()
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        measured_before = getattr(self._local, 'measured', 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = getattr(self._local, 'measured', 0.0) - measured_before
+            self._local.measured = measured_before + elapsed
+            self.add_phase_times({phase: elapsed - nested})
+
+    def add_phase_times(self, phase_times: Mapping[str, float]) -> None:
+        with self._lock:
+            for phase, seconds in phase_times.items():
+                self.phase_times[phase] += seconds
+
+    def record_fetch(self, url: str, seconds: float) -> None:
+        with self._lock:
+            self.phase_times['external'] += seconds
+            self.fetch_times[url] = self.fetch_times.get(url, 0.0) + seconds
+
+    def record_urls(self, urls: Mapping[str, List[str]]) -> None:
+        """Count the URLs about to be checked, given the pages that reference each of them."""
+        with self._lock:
+            self.total_urls += sum(len(src_paths) for src_paths in urls.values())
+            self.unique_urls.update(urls)
+
+    def record_persistent_cache_lookup(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.persistent_cache_hits += 1
+            else:
+                self.persistent_cache_misses += 1
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def get_slowest_hosts(self) -> List[Tuple[str, float, int]]:
+        """Return each host with the time spent requesting its URLs and the number of
+        URLs, slowest first."""
+        hosts: Dict[str, Tuple[float, int]] = {}
+        for url, seconds in self.fetch_times.items():
+            host = urllib.parse.urlsplit(url).hostname or ''
+            total, count = hosts.get(host, (0.0, 0))
+            hosts[host] = (total + seconds, count + 1)
+        return sorted(((host, total, count) for host, (total, count) in hosts.items()), key=lambda h: -h[1])
+
+    def as_dict(self, top: int, url_cache_hits: int = 0, url_cache_misses: int = 0) -> Dict[str, Any]:
+        slowest_urls = sorted(self.fetch_times.items(), key=lambda item: -item[1])[:top]
+        return {
+            'phases': {phase: round(seconds, 3) for phase, seconds in self.phase_times.items()},
+            'urls': {'total': self.total_urls, 'unique': len(self.unique_urls), 'fetched': len(self.fetch_times)},
+            'retries': self.retries,
+            'cache': {
+                'memory': _hit_rate(url_cache_hits, url_cache_misses),
+                'persistent': _hit_rate(self.persistent_cache_hits, self.persistent_cache_misses),
+            },
+            'slowest_urls': [{'url': url, 'seconds': round(seconds, 3)} for url, seconds in slowest_urls],
+            'slowest_hosts': [
+                {'host': host, 'seconds': round(seconds, 3), 'urls': count}
+                for host, seconds, count in self.get_slowest_hosts()[:top]
+            ],
+        }
+
+    @staticmethod
+    def format_summary(report: Dict[str, Any]) -> List[str]:
+        """Format a report returned by `as_dict` as lines to log."""
+        phases = ', '.join(f'{phase} {seconds:.2f}s' for phase, seconds in report['phases'].items())
+        urls = report['urls']
+        cache = report['cache']
+        lines = [
+            f"time spent: {phases}",
+            f"checked {urls['total']} URLs ({urls['unique']} unique, {urls['fetched']} fetched), "
+            f"{report['retries']} retries, memory cache hit rate {cache['memory']['hit_rate']:.0%}, "
+            f"persistent cache hit rate {cache['persistent']['hit_rate']:.0%}",
+        ]
+        lines += [f"slow URL: {entry['url']} ({entry['seconds']:.2f}s)" for entry in report['slowest_urls']]
+        lines += [
+            f"slow host: {entry['host']} ({entry['seconds']:.2f}s over {entry['urls']} URLs)"
+            for entry in report['slowest_hosts']
+        ]
+        return lines
+
+    @staticmethod
+    def write(report: Dict[str, Any], path: str) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+def _hit_rate(hits: int, misses: int) -> Dict[str, Any]:
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / lookups if lookups else 0.0}
@@ -0,0 +1,121 @@
+from abc import ABC, abstractmethod
+import json
+import os.path
+from typing import Any, Dict, NamedTuple, TextIO
+from xml.sax.saxutils import quoteattr
+
+RESULTS_FORMATS = ('jsonl', 'junit', 'sarif')
+TOOL_URI = 'https://github.com/manuzhang/mkdocs-htmlproofer-plugin'
+
+
+class LinkResult(NamedTuple):
+    url: str
+    # Source path of the page the link is on
+    page: str
+    status: int
+    # Seconds taken to check the link
+    latency: float
+    from_cache: bool
+    # Whether the link was reported as invalid
+    invalid: bool
+
+
+class ResultSink(ABC):
+    """Streams the result of every checked link to a file as soon as it is known,
+    so that memory use doesn't grow with the size of the site."""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file: TextIO = open(path, 'w', encoding='utf-8')
+        self.write_header()
+
+    def write_header(self) -> None:
+        pass
+
+    def write_footer(self) -> None:
+        pass
+
+    @abstractmethod
+    def write(self, result: LinkResult) -> None:
+        """Write the result of a checked link."""
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.write_footer()
+            self._file.close()
+
+
+class JsonLinesSink(ResultSink):
+    def write(self, result: LinkResult) -> None:
+        self._file.write(json.dumps(_as_record(result)) + '\n')
+
+
+class JUnitSink(ResultSink):
+    """Writes each link as a test case of a single test suite, failing the invalid ones."""
+
+    def write_header(self) -> None:
+        self._file.write('<?xml version="1.0" encoding="utf-8"?>\n<testsuites>\n<testsuite name="htmlproofer">\n')
+
+    def write(self, result: LinkResult) -> None:
+        self._file.write(
+            f'<testcase classname={quoteattr(result.page)} name={quoteattr(result.url)} time="{result.latency:.3f}">'
+        )
+        if result.invalid:
+            self._file.write(f'<failure message={quoteattr(f"invalid url - {result.url} [{result.status}]")}/>')
+        self._file.write('</testcase>\n')
+
+    def write_footer(self) -> None:
+        self._file.write('</testsuite>\n</testsuites>\n')
+
+
+class SarifSink(ResultSink):
+    """Writes each link as a SARIF result, of kind `fail` for invalid links and `pass` otherwise."""
+
+    def write_header(self) -> None:
+        log = {
+            'version': '2.1.0',
+            '$schema': 'https://json.schemastore.org/sarif-2.1.0.json',
+            'runs': [{
+                'tool': {'driver': {
+                    'name': 'htmlproofer',
+                    'informationUri': TOOL_URI,
+                    'rules': [{'id': 'invalid-url', 'shortDescription': {'text': 'Invalid URL'}}],
+                }},
+                'results': [],
+            }],
+        }
+        # The results are streamed into the (last) empty array of the log.
+        header = json.dumps(log)
+        self._footer = header[header.rindex('[]') + 1:]
+        self._file.write(header[:header.rindex('[]') + 1] + '\n')
+        self._first = True
+
+    def write(self, result: LinkResult) -> None:
+        sarif_result = {
+            'ruleId': 'invalid-url',
+            'kind': 'fail' if result.invalid else 'pass',
+            'level': 'error' if result.invalid else 'none',
+            'message': {'text': f'invalid url - {result.url} [{result.status}]' if result.invalid else result.url},
+            'locations': [{'physicalLocation': {'artifactLocation': {'uri': result.page}}}],
+            'properties': _as_record(result),
+        }
+        self._file.write(('' if self._first else ',\n') + json.dumps(sarif_result))
+        self._first = False
+
+    def write_footer(self) -> None:
+        self._file.write('\n' + self._footer + '\n')
+
+
+def _as_record(result: LinkResult) -> Dict[str, Any]:
+    record = result._asdict()
+    record['latency'] = round(result.latency, 3)
+    return record
+
+
+def open_result_sink(path: str, results_format: str) -> ResultSink:
+    """Open a sink that writes link results to the file in one of the `RESULTS_FORMATS`."""
+    if results_format == 'junit':
+        return JUnitSink(path)
+    if results_format == 'sarif':
+        return SarifSink(path)
+    return JsonLinesSink(path)
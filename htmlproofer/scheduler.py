@@ -0,0 +1,134 @@
+from concurrent.futures import Executor, Future
+from functools import partial
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from htmlproofer.ratelimit import HostThrottled
+
+# Given the status of an attempt and the number of the attempt (starting at 0),
+# return how long to wait before retrying, or None to keep the status.
+RetryPolicy = Callable[[int, int], Optional[float]]
+
+
+class RetryScheduler:
+    """Runs checks on an executor and re-queues failed attempts once their retry delay
+    has passed.
+
+    Waiting happens on a single timer thread rather than in the executor's workers,
+    so workers keep checking other URLs in the meantime. This also applies to checks
+    that raise `HostThrottled`, which are run again once their host allows it. `submit`
+    returns a future that resolves to the final status once no more retries are due.
+    """
+
+    def __init__(self, executor: Executor):
+        self._executor = executor
+        self._due: List[Tuple[float, int, Callable[[], None]]] = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, check: Callable[[], int], retry_policy: RetryPolicy) -> 'Future[int]':
+        result: 'Future[int]' = Future()
+        self._attempt(check, retry_policy, result, 0)
+        return result
+
+    def _attempt(self, check: Callable[[], int], retry_policy: RetryPolicy, result: 'Future[int]', attempt: int) -> None:
+        try:
+            future = self._executor.submit(check)
+        except RuntimeError as e:  # The executor has been shut down
+            result.set_exception(e)
+            return
+        future.add_done_callback(partial(self._on_done, check, retry_policy, result, attempt))
+
+    def _on_done(
+            self,
+            check: Callable[[], int],
+            retry_policy: RetryPolicy,
+            result: 'Future[int]',
+            attempt: int,
+            future: 'Future[int]',
+    ) -> None:
+        if future.cancelled():
+            # The executor was shut down, cancelling the checks that hadn't started yet.
+            result.cancel()
+            return
+        exception = future.exception()
+        if isinstance(exception, HostThrottled):
+            # The check couldn't make its request yet, so it's run again once it can, as the same attempt.
+            self._resume(exception, partial(self._attempt, check, retry_policy, result, attempt))
+            return
+        if exception is not None:
+            result.set_exception(exception)
+            return
+
+        status = future.result()
+        try:
+            delay = retry_policy(status, attempt)
+        except BaseException as e:
+            result.set_exception(e)
+            return
+        if delay is None:
+            result.set_result(status)
+        else:
+            self.call_later(delay, partial(self._attempt, check, retry_policy, result, attempt + 1))
+
+    def _resume(self, throttled: HostThrottled, callback: Callable[[], None]) -> None:
+        """Run the callback once a request slot of the throttled host is released, or once
+        the throttling delay has passed, whichever comes first."""
+        released = throttled.released
+        if released is None:
+            self.call_later(throttled.delay, callback)
+            return
+
+        lock = threading.Lock()
+        resumed = False
+
+        def resume() -> None:
+            nonlocal resumed
+            with lock:
+                if resumed:
+                    return
+                resumed = True
+            callback()
+
+        def stop_waiting() -> None:
+            # Skipped by `HostLimiter.release` once cancelled, so the slot goes to another check.
+            released.cancel()
+            resume()
+
+        released.add_done_callback(lambda _: resume())
+        self.call_later(throttled.delay, stop_waiting)
+
+    def call_later(self, delay: float, callback: Callable[[], None]) -> None:
+        """Run the callback on the timer thread once the delay (in seconds) has passed."""
+        with self._condition:
+            heapq.heappush(self._due, (time.monotonic() + delay, next(self._counter), callback))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='htmlproofer-retries', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._due:
+                    if self._closed:
+                        return
+                    self._condition.wait()
+                due, _, callback = self._due[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._due)
+            callback()
+
+    def close(self) -> None:
+        """Stop the timer thread once all due callbacks have run."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
@@ -0,0 +1,144 @@
+import concurrent.futures
+import os
+import posixpath
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, cast
+import urllib.parse
+
+from mkdocs.config import Config
+from mkdocs.exceptions import PluginError
+
+from htmlproofer.extract import extract_links
+from htmlproofer.plugin import LOCAL_PATTERNS, HtmlProoferPlugin
+
+# Number of pages handed to a worker process at a time.
+PAGES_PER_TASK = 64
+
+
+class SitePage(NamedTuple):
+    """The links of a built page, and the ids its fragments can point to."""
+    element_ids: FrozenSet[str]
+    urls: Set[str]
+
+
+def read_page(site_dir: str, path: str, html_parser: str) -> SitePage:
+    """Read a built page in one go and collect its links and element ids."""
+    with open(os.path.join(site_dir, path), 'rb') as f:
+        content = f.read().decode('utf-8', errors='replace')
+    # Fragments can also point to `<a name="...">` anchors of the rendered page.
+    element_ids, urls = extract_links(content, html_parser, anchor_names=True)
+    element_ids.add('')  # Empty anchor is commonly used, but not real
+    return SitePage(frozenset(element_ids), urls)
+
+
+def _read_pages(site_dir: str, paths: List[str], html_parser: str) -> List[SitePage]:
+    return [read_page(site_dir, path, html_parser) for path in paths]
+
+
+class BuiltSite:
+    """The files of an already built site, with the links and element ids of its HTML pages.
+
+    Internal links are validated against the files on disk and the ids that are
+    actually present in the rendered pages, rather than against the Markdown sources.
+    """
+
+    def __init__(self, site_dir: str, files: Set[str], pages: Dict[str, SitePage]):
+        self.site_dir = site_dir
+        self.files = files
+        self.pages = pages
+
+    @classmethod
+    def read(cls, site_dir: str, html_parser: str = 'beautifulsoup', processes: Optional[int] = None) -> 'BuiltSite':
+        """Walk the site directory, and read its HTML pages in a pool of worker processes.
+
+        With `processes` set to 1, pages are read in the current process.
+        """
+        files = set()
+        for dir_path, _, file_names in os.walk(site_dir):
+            rel_dir = os.path.relpath(dir_path, site_dir)
+            for file_name in file_names:
+                files.add(posixpath.normpath(posixpath.join(rel_dir.replace(os.sep, '/'), file_name)))
+        paths = sorted(path for path in files if path.endswith(('.html', '.htm')))
+
+        if processes == 1:
+            return cls(site_dir, files, {path: read_page(site_dir, path, html_parser) for path in paths})
+
+        chunks = [paths[i:i + PAGES_PER_TASK] for i in range(0, len(paths), PAGES_PER_TASK)]
+        pages: Dict[str, SitePage] = {}
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_read_pages, site_dir, chunk, html_parser) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                pages.update(zip(chunk, future.result()))
+        return cls(site_dir, files, pages)
+
+    def resolve_target(self, path: str, src_path: str) -> Optional[str]:
+        """Return the file of the site that a link's path points to, or None if there is none."""
+        path = urllib.parse.unquote(path)
+        if path.startswith('/'):
+            target = posixpath.normpath(path.lstrip('/') or '.')
+        else:
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(src_path), path))
+        if target.startswith('../'):
+            return None
+        if target in self.files:
+            return target
+        # Directory URLs point to the index page of the directory.
+        index = posixpath.normpath(posixpath.join(target, 'index.html'))
+        return index if index in self.files else None
+
+    def get_url_status(self, url: str, src_path: str) -> int:
+        """Check a link within the site, from the page at `src_path`."""
+        _, _, path, _, fragment = urllib.parse.urlsplit(url)
+        target = self.resolve_target(path, src_path) if path else src_path
+        if target is None:
+            return 404
+        page = self.pages.get(target)
+        if fragment and page is not None and urllib.parse.unquote(fragment) not in page.element_ids:
+            return 404
+        return 0
+
+
+def check_site(
+        site_dir: str,
+        options: Dict,
+        processes: Optional[int] = None,
+        config_file: Optional[str] = None,
+) -> None:
+    """Check the links of an already built site with the plugin's options, as `mkdocs build` would.
+
+    External URLs are checked once each, after all pages have been read. Relative paths
+    in the options are resolved against the directory of `config_file`, if given. Raises
+    `PluginError` if invalid links are present.
+    """
+    plugin = HtmlProoferPlugin()
+    errors, _ = plugin.load_config({
+        **options,
+        # Links to other pages' anchors are checked by the `BuiltSite`, against the rendered pages,
+        # rather than deferred to the plugin, which has no files to resolve them against.
+        'anchor_source': 'markdown',
+        'defer_external_urls': True,
+        'raise_error_after_finish': not options.get('raise_error', False),
+    })
+    if errors:
+        raise PluginError('; '.join(f"{name}: {error}" for name, error in errors))
+    config = cast(Config, {'config_file_path': config_file})
+    plugin.on_config(config)
+
+    with plugin.report.measure('parse'):
+        site = BuiltSite.read(site_dir, plugin.config['html_parser'], processes)
+
+    def get_status(url: str, src_path: str) -> int:
+        if urllib.parse.urlsplit(url).scheme or any(pat.match(url) for pat in LOCAL_PATTERNS):
+            return plugin.get_url_status(url, src_path, set(), {})
+        with plugin.report.measure('internal'):
+            url_status = site.get_url_status(url, src_path)
+        return plugin.resolve_internal_status(url, url_status)
+
+    try:
+        for src_path, page in site.pages.items():
+            page_ignored = plugin.is_page_ignored(src_path)
+            if not page_ignored or plugin.config['warn_on_ignored_urls']:
+                plugin.check_page_urls(page.urls, src_path, page_ignored, None, get_status)
+        plugin.on_post_build(config)
+    except Exception as e:
+        plugin.on_build_error(error=e)
+        raise
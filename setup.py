@@ -25,6 +25,9 @@ setup(
         'requests',
         'beautifulsoup4',
     ],
+    extras_require={
+        'async': ['httpx[http2]'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
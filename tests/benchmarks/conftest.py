@@ -0,0 +1,85 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+from typing import List, Optional, Tuple
+import urllib.parse
+
+import pytest
+
+import htmlproofer.plugin
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    @pytest.fixture
+    def benchmark():
+        """Stands in for the fixture of pytest-benchmark, skipping the benchmarks without it."""
+        pytest.skip('pytest-benchmark is not installed')
+
+_throughputs: List[Tuple[str, float, Optional[float]]] = []
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Answers every request after the `delay` (seconds) and with the `status` given in its query."""
+
+    def do_HEAD(self):
+        self.respond()
+
+    def do_GET(self):
+        self.respond()
+
+    def respond(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        time.sleep(float(query.get('delay', ['0'])[0]))
+        self.send_response(int(query.get('status', ['200'])[0]))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='session')
+def standin_url():
+    """Base URL of a local HTTP server standing in for external sites."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def external_standin(standin_url, monkeypatch):
+    """The stand-in's base URL, with local URLs checked like external ones."""
+    monkeypatch.setattr(htmlproofer.plugin, 'LOCAL_PATTERNS', [])
+    return standin_url
+
+
+@pytest.fixture
+def record_throughput(benchmark, request):
+    """Record the pages and links processed per second by a benchmark, from its mean time."""
+    def record(pages: int, links: Optional[int] = None) -> None:
+        if benchmark.stats is None:  # Benchmarks are disabled
+            return
+        mean = benchmark.stats.stats.mean
+        links_per_second = links / mean if links is not None else None
+        benchmark.extra_info['pages_per_second'] = round(pages / mean, 1)
+        if links_per_second is not None:
+            benchmark.extra_info['links_per_second'] = round(links_per_second, 1)
+        _throughputs.append((request.node.name, pages / mean, links_per_second))
+    return record
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _throughputs:
+        return
+    terminalreporter.section('throughput')
+    width = max(len(name) for name, _, _ in _throughputs)
+    for name, pages_per_second, links_per_second in _throughputs:
+        line = f'{name:<{width}}  {pages_per_second:>12,.1f} pages/s'
+        if links_per_second is not None:
+            line += f'  {links_per_second:>14,.1f} links/s'
+        terminalreporter.write_line(line)
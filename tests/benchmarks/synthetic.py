@@ -0,0 +1,121 @@
+"""Generates synthetic MkDocs sites, as rendered pages or as Markdown sources, for benchmarks."""
+import os
+import posixpath
+import random
+from types import SimpleNamespace
+from typing import Dict, List, NamedTuple, Tuple
+
+from mkdocs.structure.files import File, Files
+
+SECTIONS = 10
+FILLER = '<p>' + 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8 + '</p>\n'
+
+
+class SiteSpec(NamedTuple):
+    pages: int = int(os.environ.get('HTMLPROOFER_BENCH_PAGES', 200))
+    links_per_page: int = 20
+    headings_per_page: int = 5
+    # Share of the links that point to external URLs
+    external_ratio: float = 0.2
+    # Number of distinct external URLs, as a share of the external links
+    external_unique_ratio: float = 0.25
+    # Share of the external URLs that fail, and how long the stand-in takes to answer each
+    error_rate: float = 0.05
+    latency: float = 0.005
+    seed: int = 0
+
+
+class Link(NamedTuple):
+    markdown: str
+    html: str
+
+
+def page_path(i: int) -> str:
+    return f'section{i % SECTIONS}/page{i}.md'
+
+
+def generate_links(spec: SiteSpec, external_base_url: str) -> Dict[int, List[Link]]:
+    """Pick the links of every page, returning them as written in Markdown and as rendered."""
+    rng = random.Random(spec.seed)
+    external_count = max(1, int(spec.pages * spec.links_per_page * spec.external_ratio * spec.external_unique_ratio))
+    external_urls = [
+        f'{external_base_url}/ext/{k}?delay={spec.latency}&status={404 if rng.random() < spec.error_rate else 200}'
+        for k in range(external_count)
+    ]
+
+    links = {}
+    for i in range(spec.pages):
+        page_links = []
+        for _ in range(spec.links_per_page):
+            if rng.random() < spec.external_ratio:
+                url = rng.choice(external_urls)
+                page_links.append(Link(url, url))
+                continue
+            anchor = f'#heading-{rng.randrange(spec.headings_per_page)}' if spec.headings_per_page else ''
+            if rng.random() < 0.2:
+                page_links.append(Link(anchor or '#', anchor or '#'))
+                continue
+            target = posixpath.relpath(page_path(rng.randrange(spec.pages)), posixpath.dirname(page_path(i)))
+            page_links.append(Link(target + anchor, target[:-len('.md')] + '.html' + anchor))
+        links[i] = page_links
+    return links
+
+
+def generate_markdown(spec: SiteSpec, i: int, links: List[Link]) -> str:
+    lines = [f'# Page {i}', '']
+    per_heading = max(1, len(links) // max(1, spec.headings_per_page))
+    for h in range(spec.headings_per_page):
+        lines += [f'## Heading {h}', '']
+        lines += [f'See [link {n}]({link.markdown}).' for n, link in enumerate(links[h * per_heading:(h + 1) * per_heading])]
+        lines.append('')
+    lines += [f'See [link {n}]({link.markdown}).' for n, link in enumerate(links[spec.headings_per_page * per_heading:])]
+    return '\n'.join(lines) + '\n'
+
+
+def render_page(spec: SiteSpec, i: int, links: List[Link]) -> str:
+    """Render a page roughly like MkDocs would, without navigation."""
+    parts = [f'<h1 id="page-{i}">Page {i}</h1>\n']
+    per_heading = max(1, len(links) // max(1, spec.headings_per_page))
+    for h in range(spec.headings_per_page):
+        parts.append(f'<h2 id="heading-{h}">Heading {h}<a class="headerlink" href="#heading-{h}">&para;</a></h2>\n')
+        parts.append(FILLER)
+        parts += [f'<p>See <a href="{link.html}">link</a>.</p>\n' for link in links[h * per_heading:(h + 1) * per_heading]]
+    parts += [f'<p>See <a href="{link.html}">link</a>.</p>\n' for link in links[spec.headings_per_page * per_heading:]]
+    return ''.join(parts)
+
+
+def build_pages(spec: SiteSpec, external_base_url: str) -> Tuple[Files, List[SimpleNamespace]]:
+    """Build the files of a site, and its pages as rendered, to feed to the plugin's hooks."""
+    links = generate_links(spec, external_base_url)
+    files = []
+    pages = []
+    for i in range(spec.pages):
+        file = File(page_path(i), 'docs', 'site', use_directory_urls=False)
+        file.page = SimpleNamespace(markdown=generate_markdown(spec, i, links[i]))  # type: ignore[assignment]
+        files.append(file)
+        pages.append(SimpleNamespace(file=file, content=render_page(spec, i, links[i])))
+    return Files(files), pages
+
+
+def write_site(spec: SiteSpec, path: str, external_base_url: str, plugin_config: str = '') -> str:
+    """Write the Markdown sources and the mkdocs.yml of a site, returning the path of the config file."""
+    links = generate_links(spec, external_base_url)
+    for i in range(spec.pages):
+        page_file = os.path.join(path, 'docs', page_path(i))
+        os.makedirs(os.path.dirname(page_file), exist_ok=True)
+        with open(page_file, 'w', encoding='utf-8') as f:
+            f.write(generate_markdown(spec, i, links[i]))
+    with open(os.path.join(path, 'docs', 'index.md'), 'w', encoding='utf-8') as f:
+        f.write('# Home\n')
+
+    config_file = os.path.join(path, 'mkdocs.yml')
+    with open(config_file, 'w', encoding='utf-8') as f:
+        f.write(
+            'site_name: Benchmark\n'
+            'use_directory_urls: False\n'
+            'plugins:\n'
+            '  - htmlproofer:\n'
+            '      skip_downloads: True\n'
+            + ''.join(f'      {line}\n' for line in plugin_config.splitlines())
+        )
+    return config_file
@@ -0,0 +1,86 @@
+from unittest.mock import Mock
+
+from mkdocs.commands.build import build
+from mkdocs.config import Config, load_config
+import pytest
+from synthetic import SiteSpec, build_pages, generate_links, generate_markdown, write_site
+
+from htmlproofer.plugin import FileIndex, HtmlProoferPlugin
+
+SPEC = SiteSpec()
+LINKS = SPEC.pages * SPEC.links_per_page
+
+
+def new_plugin(files, **options):
+    plugin = HtmlProoferPlugin()
+    plugin.load_config({'skip_downloads': True, **options})
+    config = Mock(spec=Config, __getitem__=Mock(return_value=None))
+    plugin.on_config(config)
+    plugin.on_files(files, config)
+    return plugin
+
+
+@pytest.mark.parametrize('html_parser', ('beautifulsoup', 'stream'))
+def test_on_post_page__internal(benchmark, record_throughput, html_parser):
+    files, pages = build_pages(SPEC._replace(external_ratio=0), 'https://example.com')
+
+    def check_pages(plugin):
+        for page in pages:
+            plugin.on_post_page('', page, None)
+        plugin.on_post_build(None)
+
+    benchmark.pedantic(
+        check_pages, setup=lambda: ((new_plugin(files, html_parser=html_parser),), {}), rounds=5
+    )
+    record_throughput(SPEC.pages, LINKS)
+
+
+def test_on_post_page__external(benchmark, record_throughput, external_standin):
+    files, pages = build_pages(SPEC, external_standin)
+
+    def check_pages(plugin):
+        for page in pages:
+            plugin.on_post_page('', page, None)
+        plugin.on_post_build(None)
+
+    benchmark.pedantic(check_pages, setup=lambda: ((new_plugin(files, max_workers=32),), {}), rounds=3)
+    record_throughput(SPEC.pages, LINKS)
+
+
+def test_get_anchors(benchmark, record_throughput):
+    links = generate_links(SPEC, 'https://example.com')
+    markdowns = [generate_markdown(SPEC, i, links[i]) for i in range(SPEC.pages)]
+
+    def collect_anchors():
+        for markdown in markdowns:
+            HtmlProoferPlugin.contains_anchor(markdown, 'heading-0')
+
+    benchmark(collect_anchors)
+    record_throughput(SPEC.pages)
+
+
+def test_find_source_file(benchmark, record_throughput):
+    files, pages = build_pages(SPEC._replace(external_ratio=0), 'https://example.com')
+    index = FileIndex(files)
+    links = generate_links(SPEC._replace(external_ratio=0), 'https://example.com')
+    targets = [
+        (link.html.partition('#')[0], page.file.src_path)
+        for page, page_links in zip(pages, links.values())
+        for link in page_links
+        if not link.html.startswith('#')
+    ]
+
+    def find_source_files():
+        for url, src_path in targets:
+            HtmlProoferPlugin.find_source_file(url, src_path, index)
+
+    benchmark(find_source_files)
+    record_throughput(SPEC.pages, len(targets))
+
+
+@pytest.mark.parametrize('plugin_config', ('', 'html_parser: stream', 'processes: 2'))
+def test_mkdocs_build(benchmark, record_throughput, external_standin, tmp_path, plugin_config):
+    config_file = write_site(SPEC, str(tmp_path), external_standin, plugin_config)
+
+    benchmark.pedantic(lambda: build(load_config(config_file)), rounds=2)
+    record_throughput(SPEC.pages, LINKS)
@@ -0,0 +1,114 @@
+from typing import FrozenSet
+
+from htmlproofer.anchors import AnchorCheck, ExternalAnchorCache, RemoteDocument
+from htmlproofer.checkers import StreamedResponse
+
+
+class _Body:
+    """The chunks of a response body, recording how many were read and whether it was closed."""
+
+    def __init__(self, *chunks: bytes):
+        self.chunks = chunks
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.chunks:
+                self.read += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+
+def open_document(
+        *chunks: bytes,
+        status: int = 200,
+        content_type: str = 'text/html',
+        max_bytes: int = 1000,
+        expected: FrozenSet[str] = frozenset(),
+):
+    body = _Body(*chunks)
+    response = StreamedResponse(status, 'https://example.com/page', content_type, iter(body))
+    return RemoteDocument(response, max_bytes, expected), body
+
+
+def test_remote_document__stops_reading_once_anchor_found():
+    document, body = open_document(
+        b'<h1 id="first">', b'</h1><p><a name="second"></a>', b'<dt id="re.sub"></dt>',
+        expected=frozenset({'first', 'second', 'missing'}),
+    )
+
+    assert document.has_anchor('first')
+    assert body.read == 1
+    assert document.has_anchor('second')
+    assert body.read == 2
+    assert not body.closed
+    assert document.has_anchor('missing') is False
+    assert body.closed
+    assert document.has_anchor('re.sub')
+
+
+def test_remote_document__released_once_expected_anchors_found():
+    document, body = open_document(
+        b'<h1 id="first">', b'</h1><p><a name="second"></a>', b'<dt id="re.sub"></dt>',
+        expected=frozenset({'first', 'second'}),
+    )
+
+    assert document.has_anchor('second')
+    assert body.read == 2 and body.closed
+    assert document.has_anchor('first')
+    # Anchors that weren't seen before the response was closed are unknown.
+    assert document.has_anchor('re.sub') is None
+    assert document.is_released()
+
+
+def test_remote_document__max_bytes():
+    document, body = open_document(b'<p id="a">' + b' ' * 10, b'<p id="b">', max_bytes=10)
+
+    assert document.has_anchor('b') is None
+    assert body.read == 1 and body.closed
+    assert document.has_anchor('a')
+
+
+def test_remote_document__not_html():
+    document, body = open_document(b'<p id="a">', content_type='application/pdf')
+    assert document.has_anchor('a') is None
+    assert body.read == 0
+
+
+def test_remote_document__charset():
+    document, _ = open_document('<p id="café">'.encode('latin-1'), content_type='text/html; charset=ISO-8859-1')
+    assert document.has_anchor('café')
+
+
+def test_external_anchor_cache__one_request_per_document():
+    responses = []
+    bodies = []
+
+    def open_stream(url, deadline):
+        body = _Body(b'<h2 id="a"></h2>', b'<h2 id="b"></h2>')
+        responses.append(url)
+        bodies.append(body)
+        return StreamedResponse(200, url, 'text/html', iter(body))
+
+    cache = ExternalAnchorCache(open_stream, 1000)
+    cache.expect(['https://example.com/page#a', 'https://example.com/page#b', 'https://example.com/other'])
+
+    assert cache.check('https://example.com/page#a') == AnchorCheck(200, 'https://example.com/page', True)
+    assert not bodies[0].closed
+    assert cache.check('https://example.com/page#b') == AnchorCheck(200, 'https://example.com/page', True)
+    # The response is released once all the expected anchors have been found.
+    assert bodies[0].closed and bodies[0].read == 2
+    assert responses == ['https://example.com/page']
+
+    # Anchors that weren't expected have the document streamed again.
+    assert cache.check('https://example.com/page#c') == AnchorCheck(200, 'https://example.com/page', False)
+    assert cache.check('https://example.com/page#a%20b') == AnchorCheck(200, 'https://example.com/page', False)
+    assert responses == ['https://example.com/page'] * 2
+    assert all(body.closed for body in bodies)
+
+    cache.discard('https://example.com/page#a')
+    assert cache.check('https://example.com/page#b').has_anchor
+    assert responses == ['https://example.com/page'] * 3
+    cache.close()
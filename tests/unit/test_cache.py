@@ -0,0 +1,143 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from htmlproofer.cache import CachedResult, PersistentUrlCache, UrlResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PersistentUrlCache(str(tmp_path), success_ttl=100, failure_ttl=10)
+
+
+def test_get__missing(cache):
+    assert cache.get('https://example.com') is None
+
+
+@pytest.mark.parametrize(
+    'status, age, expected_hit', [
+        (200, 50, True),
+        (200, 150, False),
+        (404, 5, True),
+        (404, 50, False),
+        (-1, 50, False),
+    ]
+)
+def test_get__ttl(cache, status, age, expected_hit):
+    with patch('time.time', return_value=1000.0):
+        cache.set('https://example.com', status, 'https://example.com/')
+    with patch('time.time', return_value=1000.0 + age):
+        result = cache.get('https://example.com')
+
+    if expected_hit:
+        assert result == CachedResult(status, 1000.0, 'https://example.com/')
+    else:
+        assert result is None
+
+
+def test_save_and_load(cache, tmp_path):
+    cache.set('https://example.com', 200, 'https://example.com/')
+    cache.set('https://example.com/missing', 404, 'https://example.com/missing')
+    cache.save()
+
+    loaded = PersistentUrlCache(str(tmp_path), success_ttl=100, failure_ttl=10)
+    loaded.load()
+    assert loaded.get('https://example.com').status == 200
+    assert loaded.get('https://example.com/missing').status == 404
+
+
+def test_load__skips_expired_and_corrupt_lines(cache, tmp_path):
+    (tmp_path / 'htmlproofer-cache.jsonl').write_text(
+        '{"url": "https://old.com", "status": 200, "timestamp": 0, "final_url": "https://old.com"}\n'
+        'not json\n'
+        '{"url": "https://partial.com"}\n'
+    )
+    cache.load()
+    assert cache.get('https://old.com') is None
+    assert cache.get('https://partial.com') is None
+
+
+def test_url_result_cache__hits_and_misses():
+    cache = UrlResultCache(max_size=10, ttl=None)
+    fetch = Mock(return_value=200)
+
+    assert cache.get_or_fetch('https://example.com', fetch) == 200
+    assert cache.get_or_fetch('https://example.com', fetch) == 200
+    fetch.assert_called_once()
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.discard('https://example.com')
+    assert cache.get_or_fetch('https://example.com', fetch) == 200
+    assert fetch.call_count == 2
+
+
+def test_url_result_cache__evicts_least_recently_used():
+    cache = UrlResultCache(max_size=2, ttl=None)
+    cache.get_or_fetch('a', lambda: 1)
+    cache.get_or_fetch('b', lambda: 2)
+    cache.get_or_fetch('a', lambda: 0)
+    cache.get_or_fetch('c', lambda: 3)
+
+    assert cache.get_or_fetch('a', lambda: 0) == 1
+    assert cache.get_or_fetch('b', lambda: 0) == 0
+
+
+def test_url_result_cache__ttl():
+    cache = UrlResultCache(max_size=10, ttl=60)
+    with patch('time.monotonic', return_value=100.0):
+        cache.get_or_fetch('https://example.com', lambda: 200)
+    with patch('time.monotonic', return_value=160.0):
+        assert cache.get_or_fetch('https://example.com', lambda: 404) == 200
+    with patch('time.monotonic', return_value=161.0):
+        assert cache.get_or_fetch('https://example.com', lambda: 404) == 404
+
+
+def test_url_result_cache__single_flight():
+    cache = UrlResultCache(max_size=10, ttl=None)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 200
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(cache.get_or_fetch, 'https://example.com', fetch)
+        assert started.wait(5)
+        others = [executor.submit(cache.get_or_fetch, 'https://example.com', fetch) for _ in range(3)]
+        release.set()
+        assert [future.result() for future in [first, *others]] == [200] * 4
+
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_url_result_cache__single_flight_async():
+    cache = UrlResultCache(max_size=10, ttl=None)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return 200
+
+    async def lookups():
+        return await asyncio.gather(*(cache.get_or_fetch_async('https://example.com', fetch) for _ in range(4)))
+
+    assert asyncio.run(lookups()) == [200] * 4
+    assert asyncio.run(cache.get_or_fetch_async('https://example.com', fetch)) == 200
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (4, 1)
+
+
+def test_url_result_cache__failed_fetch_not_cached():
+    cache = UrlResultCache(max_size=10, ttl=None)
+    with pytest.raises(ValueError):
+        cache.get_or_fetch('https://example.com', Mock(side_effect=ValueError))
+    assert cache.get_or_fetch('https://example.com', lambda: 200) == 200
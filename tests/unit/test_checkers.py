@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sys
+import threading
+from unittest.mock import Mock, patch
+
+from mkdocs.exceptions import PluginError
+import pytest
+import requests
+from requests import Response
+
+from htmlproofer.checkers import AsyncioChecker, RequestsChecker, Timeout, create_checker
+from htmlproofer.ratelimit import DeadlineExceeded, HostLimiter
+
+CHECKER_OPTIONS = {'skip_downloads': False, 'timeout': 5.0, 'headers': {'User-Agent': 'test'}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_HEAD(self):
+        self.requests.append(('HEAD', self.path, self.headers.get('Range')))
+        if self.path.startswith('/nohead'):
+            self.send_response(405)
+        else:
+            self.send_response(200 if self.path == '/ok' else 404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self.requests.append(('GET', self.path, self.headers.get('Range')))
+        if self.path == '/redirect':
+            self.send_response(301)
+            self.send_header('Location', '/ok')
+            self.end_headers()
+            return
+        body = b'<html></html>'
+        if self.headers.get('Range'):
+            body = body[:1]
+            self.send_response(206)
+        else:
+            self.send_response(200 if self.path in ('/ok', '/nohead', '/nohead2') else 404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize(
+    'exception, expected_status', [
+        (requests.exceptions.Timeout(), 504),
+        (requests.exceptions.TooManyRedirects(), -1),
+        (requests.exceptions.ConnectionError(), -1),
+    ]
+)
+def test_requests_checker__errors(exception, expected_status):
+    checker = RequestsChecker(**CHECKER_OPTIONS)
+    with patch('requests.Session.get', side_effect=exception):
+        assert checker.fetch('https://example.com') == (expected_status, 'https://example.com')
+
+
+def test_requests_checker__downloads_body():
+    checker = RequestsChecker(**CHECKER_OPTIONS)
+    iter_content = Mock(return_value=[b'chunk'])
+    response = Mock(spec=Response, status_code=200, url='https://example.com/', headers={}, iter_content=iter_content)
+    with patch('requests.Session.get', return_value=response):
+        assert checker.fetch('https://example.com') == (200, 'https://example.com/')
+    iter_content.assert_called_once()
+
+
+def test_requests_checker__host_timeouts():
+    limiter = HostLimiter({'*.slow.example.com': {'read_timeout': 60}})
+    checker = RequestsChecker(**{**CHECKER_OPTIONS, 'timeout': Timeout(3.0, 10.0)}, limiter=limiter)
+    response = Mock(spec=Response, status_code=200, url='https://example.com/', headers={},
+                    iter_content=Mock(return_value=[]))
+    with patch('requests.Session.get', return_value=response) as get_mock:
+        checker.fetch('https://example.com/')
+        checker.fetch('https://docs.slow.example.com/')
+
+    assert [call.kwargs['timeout'] for call in get_mock.call_args_list] == [(3.0, 10.0), (3.0, 60)]
+
+
+def test_requests_checker__deadline():
+    checker = RequestsChecker(**{**CHECKER_OPTIONS, 'timeout': Timeout(3.0, 10.0)})
+    response = Mock(spec=Response, status_code=200, url='https://example.com/', headers={},
+                    iter_content=Mock(return_value=[]))
+    with patch('time.monotonic', return_value=100.0), \
+            patch('requests.Session.get', return_value=response) as get_mock:
+        checker.fetch('https://example.com/', deadline=105.0)
+        assert get_mock.call_args.kwargs['timeout'] == (3.0, 5.0)
+        with pytest.raises(DeadlineExceeded):
+            checker.fetch('https://example.com/', deadline=100.0)
+    get_mock.assert_called_once()
+
+
+def test_create_checker__default_backend():
+    assert isinstance(create_checker('requests', max_connections=10, **CHECKER_OPTIONS), RequestsChecker)
+
+
+def test_create_checker__asyncio_without_httpx():
+    with patch.dict(sys.modules, {'httpx': None}):
+        with pytest.raises(PluginError):
+            create_checker('asyncio', **CHECKER_OPTIONS)
+
+
+def test_asyncio_checker(server_url):
+    pytest.importorskip('httpx')
+    checker = create_checker('asyncio', max_connections=4, **CHECKER_OPTIONS)
+    assert isinstance(checker, AsyncioChecker)
+    try:
+        assert checker.fetch(f'{server_url}/ok') == (200, f'{server_url}/ok')
+        assert checker.fetch(f'{server_url}/missing') == (404, f'{server_url}/missing')
+        assert checker.fetch(f'{server_url}/redirect') == (200, f'{server_url}/ok')
+        assert checker.fetch('http://127.0.0.1:1/') == (-1, 'http://127.0.0.1:1/')
+    finally:
+        checker.close()
+
+
+@pytest.mark.parametrize('backend', ('requests', 'asyncio'))
+def test_checker__head_probe(server_url, backend):
+    if backend == 'asyncio':
+        pytest.importorskip('httpx')
+    checker = create_checker(backend, probe_method='head', **CHECKER_OPTIONS)
+    _Handler.requests.clear()
+    try:
+        assert checker.fetch(f'{server_url}/ok')[0] == 200
+        assert _Handler.requests == [('HEAD', '/ok', None)]
+
+        # HEAD is rejected, so a ranged GET is used instead and remembered for the host.
+        _Handler.requests.clear()
+        assert checker.fetch(f'{server_url}/nohead')[0] == 206
+        assert _Handler.requests == [('HEAD', '/nohead', None), ('GET', '/nohead', 'bytes=0-0')]
+        assert checker.head_unsupported_hosts == {'127.0.0.1'}
+
+        _Handler.requests.clear()
+        assert checker.fetch(f'{server_url}/nohead2')[0] == 206
+        assert _Handler.requests == [('GET', '/nohead2', 'bytes=0-0')]
+    finally:
+        checker.close()
+
+
+class _KeepAliveHandler(_Handler):
+    protocol_version = 'HTTP/1.1'
+    client_ports = set()
+
+    def do_GET(self):
+        self.client_ports.add(self.client_address[1])
+        super().do_GET()
+
+
+@pytest.mark.parametrize('keep_alive', (True, False))
+def test_requests_checker__shares_connections_across_threads(keep_alive):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/ok'
+    checker = RequestsChecker(pool_size_per_host=2, keep_alive=keep_alive, **CHECKER_OPTIONS)
+    _KeepAliveHandler.client_ports.clear()
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            assert list(executor.map(checker.fetch, [url] * 20)) == [(200, url)] * 20
+    finally:
+        checker.close()
+        server.shutdown()
+        server.server_close()
+
+    if keep_alive:
+        assert len(_KeepAliveHandler.client_ports) <= 2
+    else:
+        assert len(_KeepAliveHandler.client_ports) == 20
+
+
+@pytest.mark.parametrize('backend', ('requests', 'asyncio'))
+def test_checker__open_stream(server_url, backend):
+    if backend == 'asyncio':
+        pytest.importorskip('httpx')
+    checker = create_checker(backend, **CHECKER_OPTIONS)
+    try:
+        response = checker.open_stream(f'{server_url}/redirect')
+        assert (response.status, response.final_url) == (200, f'{server_url}/ok')
+        assert b''.join(response.chunks) == b'<html></html>'
+
+        response = checker.open_stream('http://127.0.0.1:1/')
+        assert response.status == -1
+        assert list(response.chunks) == []
+    finally:
+        checker.close()
@@ -0,0 +1,52 @@
+import pytest
+
+from htmlproofer.extract import PageLinks, extract_links
+
+PAGE = '''<!doctype html>
+<html><head><link href="style.css" rel="stylesheet"><title>Page</title></head>
+<body>
+<nav><a href="index.html" id="home">Home</a><div id="nav-only"></div></nav>
+<h1 id="title">Title<a class="headerlink" href="#title">&para;</a></h1>
+<p id="paragraph">Text with <a href="https://example.com/?a=1&amp;b=2">a link</a>
+and an image <img alt="x" src="assets/image.png" id="image"></p>
+<ul><li id="item">Item <span id="in-item">nested</span><img src="nested.svg"></li></ul>
+<p>Footnote<sup id="fnref:1"><a class="footnote-ref" href="#fn:1">1</a></sup></p>
+<div class="footnote"><ol><li id="fn:1"><p>Note <a href="#fnref:1">&#8617;</a></p></li></ol></div>
+<h2 id="empty-anchor"><a href="">empty</a><a href>valueless</a><a>no href</a></h2>
+<img alt="no source">
+<script>var html = '<a href="script.html" id="script">';</script>
+</body></html>
+'''
+
+
+@pytest.mark.parametrize(
+    'content', [
+        PAGE,
+        '<a href="https://google.com"><a/>',
+        '<a href="a" href="b" id="1" id="2">',
+        '<div><li id="a"></div><span id="b">',
+        '<img id="i"></img><span id="s">',
+        '<li id="open"><div id="unclosed"><a href="x.html"></li><span id="after">',
+        '<p id="outside"><span id="also-outside"></span></p>',
+        '<H2 ID="UPPER"><A HREF="Upper.html">x</A></H2>',
+        '',
+    ]
+)
+def test_extract_links__parsers_agree(content):
+    assert extract_links(content, 'stream') == extract_links(content, 'beautifulsoup')
+
+
+@pytest.mark.parametrize('parser', ('beautifulsoup', 'stream'))
+def test_extract_links(parser):
+    assert extract_links(PAGE, parser) == PageLinks(
+        {'home', 'title', 'image', 'item', 'in-item', 'fnref:1', 'fn:1', 'empty-anchor'},
+        {'index.html', '#title', 'https://example.com/?a=1&b=2', 'assets/image.png', 'nested.svg', '#fn:1',
+         '#fnref:1', ''},
+    )
+
+
+@pytest.mark.parametrize('parser', ('beautifulsoup', 'stream'))
+def test_extract_links__anchor_names(parser):
+    content = '<td><a name="REGISTER"></a></td><h2 id="title"><a name="named" href="#title"></a></h2>'
+    assert extract_links(content, parser).element_ids == {'title'}
+    assert extract_links(content, parser, anchor_names=True).element_ids == {'title', 'REGISTER', 'named'}
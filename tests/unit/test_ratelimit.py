@@ -0,0 +1,192 @@
+import email.utils
+import time
+from unittest.mock import Mock, patch
+
+from mkdocs.exceptions import PluginError
+import pytest
+from requests import Response
+
+from htmlproofer.checkers import RequestsChecker
+from htmlproofer.ratelimit import (
+    MAX_PARK_TIME,
+    MAX_RETRY_AFTER,
+    POLL_INTERVAL,
+    CircuitBreaker,
+    DeadlineExceeded,
+    HostLimiter,
+    HostThrottled,
+    parse_retry_after,
+)
+
+
+@pytest.mark.parametrize(
+    'host_limits', [
+        {'github.com': {'unknown': 1}},
+        {'github.com': {'max_concurrency': 0}},
+        {'github.com': {'rate': 0}},
+        {'github.com': {'read_timeout': -1}},
+    ]
+)
+def test_host_limiter__invalid_limits(host_limits):
+    with pytest.raises(PluginError):
+        HostLimiter(host_limits)
+
+
+def test_host_limiter__max_concurrency():
+    limiter = HostLimiter({'*.github.com': {'max_concurrency': 1}, 'github.com': {'max_concurrency': 2}})
+
+    assert limiter.try_acquire('api.github.com') == 0
+    assert limiter.try_acquire('API.github.com') == POLL_INTERVAL
+    assert limiter.try_acquire('github.com') == 0
+    assert limiter.try_acquire('github.com') == 0
+    assert limiter.try_acquire('github.com') == POLL_INTERVAL
+    # Other hosts are not limited.
+    assert limiter.try_acquire('example.com') == 0
+
+    limiter.release('api.github.com')
+    assert limiter.try_acquire('api.github.com') == 0
+
+
+def test_host_limiter__rate():
+    with patch('time.monotonic', return_value=100.0):
+        limiter = HostLimiter({'github.com': {'rate': 2}})
+        assert limiter.try_acquire('github.com') == 0
+        assert limiter.try_acquire('github.com') == 0
+        assert limiter.try_acquire('github.com') == pytest.approx(0.5)
+        assert limiter.try_acquire('example.com') == 0
+    with patch('time.monotonic', return_value=100.5):
+        assert limiter.try_acquire('github.com') == 0
+
+
+def test_host_limiter__pause():
+    limiter = HostLimiter()
+    with patch('time.monotonic', return_value=100.0):
+        limiter.observe('github.com', 429, '10')
+        limiter.observe('example.com', 404, '10')
+        assert limiter.try_acquire('github.com') == pytest.approx(10)
+        assert limiter.try_acquire('example.com') == 0
+    with patch('time.monotonic', return_value=110.0):
+        assert limiter.try_acquire('github.com') == 0
+
+
+def test_host_limiter__slot_does_not_wait():
+    limiter = HostLimiter({'github.com': {'max_concurrency': 1}})
+    with limiter.slot('github.com'):
+        with pytest.raises(HostThrottled) as exc_info:
+            with limiter.slot('github.com'):
+                pass
+        assert exc_info.value.delay == MAX_PARK_TIME
+        released = exc_info.value.released
+        assert released is not None and not released.done()
+        with limiter.slot('example.com'):
+            pass
+    # The waiting check is woken as soon as the request ends.
+    assert released.done()
+    with limiter.slot('github.com'):
+        pass
+
+
+def test_host_limiter__release_skips_cancelled_waits():
+    limiter = HostLimiter({'github.com': {'max_concurrency': 1}})
+    waits = []
+    with limiter.slot('github.com'):
+        for _ in range(2):
+            with pytest.raises(HostThrottled) as exc_info:
+                with limiter.slot('github.com'):
+                    pass
+            waits.append(exc_info.value.released)
+        # The first check was tried again already, so the release goes to the second one.
+        assert waits[0].cancel()
+    assert waits[1].done() and not waits[1].cancelled()
+
+
+def test_host_limiter__slot_deadline():
+    limiter = HostLimiter()
+    with patch('time.monotonic', return_value=100.0):
+        limiter.pause('github.com', 10)
+        with pytest.raises(HostThrottled):
+            with limiter.slot('github.com', deadline=111.0):
+                pass
+        # The host won't allow a request before the deadline.
+        with pytest.raises(DeadlineExceeded):
+            with limiter.slot('github.com', deadline=109.0):
+                pass
+        with limiter.slot('example.com', deadline=109.0):
+            pass
+
+
+@pytest.mark.parametrize(
+    'value, expected', [
+        (None, None),
+        ('', None),
+        ('5', 5.0),
+        ('-5', 0.0),
+        ('100000', MAX_RETRY_AFTER),
+        ('not a date', None),
+    ]
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+def test_parse_retry_after__http_date():
+    value = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert parse_retry_after(value) == pytest.approx(30, abs=2)
+
+
+def test_requests_checker__honours_retry_after():
+    limiter = HostLimiter()
+    checker = RequestsChecker(skip_downloads=True, timeout=1.0, headers={}, limiter=limiter)
+    response = Mock(spec=Response, status_code=429, url='https://github.com/', headers={'Retry-After': '30'})
+    with patch('requests.Session.get', return_value=response):
+        assert checker.fetch('https://github.com/') == (429, 'https://github.com/')
+
+    assert limiter.try_acquire('github.com') == pytest.approx(30, abs=1)
+    assert limiter.try_acquire('example.com') == 0
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(threshold=2)
+
+    assert not breaker.record('down.example.com', failed=True)
+    assert breaker.allow('down.example.com')
+    # A success resets the count of consecutive failures.
+    assert not breaker.record('down.example.com', failed=False)
+    assert not breaker.record('down.example.com', failed=True)
+    assert breaker.record('Down.example.com', failed=True)
+    assert not breaker.allow('down.example.com')
+    assert breaker.allow('example.com')
+
+
+def test_circuit_breaker__half_open_after_cooldown():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    with patch('time.monotonic', return_value=1000.0):
+        assert breaker.record('example.com', failed=True)
+    with patch('time.monotonic', return_value=1059.0):
+        assert not breaker.allow('example.com')
+
+    with patch('time.monotonic', return_value=1060.0):
+        # A single probe is let through, and its failure reopens the circuit.
+        assert breaker.allow('example.com')
+        assert not breaker.allow('example.com')
+        assert not breaker.record('example.com', failed=True)
+    with patch('time.monotonic', return_value=1119.0):
+        assert not breaker.allow('example.com')
+
+    with patch('time.monotonic', return_value=1120.0):
+        assert breaker.allow('example.com')
+        breaker.record('example.com', failed=False)
+        assert breaker.allow('example.com')
+        assert breaker.allow('example.com')
+
+
+def test_circuit_breaker__cancelled_probe():
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    with patch('time.monotonic', return_value=1000.0):
+        breaker.record('example.com', failed=True)
+    with patch('time.monotonic', return_value=1060.0):
+        assert breaker.allow('example.com')
+        # The probe couldn't be made, so another one is let through.
+        breaker.cancel('example.com')
+        assert breaker.allow('example.com')
+        assert not breaker.allow('example.com')
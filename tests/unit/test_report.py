@@ -0,0 +1,57 @@
+import json
+from unittest.mock import patch
+
+import pytest
+
+from htmlproofer.report import BuildReport
+
+
+def test_measure__excludes_nested_phases():
+    report = BuildReport()
+    with patch('time.perf_counter', side_effect=[0.0, 1.0, 4.0, 10.0]):
+        with report.measure('internal'):
+            with report.measure('anchors'):
+                pass
+
+    assert report.phase_times['anchors'] == 3.0
+    assert report.phase_times['internal'] == 7.0
+
+
+def test_as_dict():
+    report = BuildReport()
+    report.record_urls({'https://a.com/1': ['a.md', 'b.md'], 'https://b.com/': ['a.md']})
+    report.record_urls({'https://a.com/1': ['c.md']})
+    report.record_fetch('https://a.com/1', 1.0)
+    report.record_fetch('https://a.com/2', 2.0)
+    report.record_fetch('https://b.com/', 2.5)
+    report.record_retry()
+    report.record_persistent_cache_lookup(True)
+    report.record_persistent_cache_lookup(False)
+
+    result = report.as_dict(top=2, url_cache_hits=3, url_cache_misses=1)
+
+    assert result['phases']['external'] == 5.5
+    assert result['urls'] == {'total': 4, 'unique': 2, 'fetched': 3}
+    assert result['retries'] == 1
+    assert result['cache']['memory'] == {'hits': 3, 'misses': 1, 'hit_rate': 0.75}
+    assert result['cache']['persistent']['hit_rate'] == 0.5
+    assert result['slowest_urls'] == [
+        {'url': 'https://b.com/', 'seconds': 2.5},
+        {'url': 'https://a.com/2', 'seconds': 2.0},
+    ]
+    assert result['slowest_hosts'] == [
+        {'host': 'a.com', 'seconds': 3.0, 'urls': 2},
+        {'host': 'b.com', 'seconds': 2.5, 'urls': 1},
+    ]
+    assert len(BuildReport.format_summary(result)) == 6
+
+
+@pytest.mark.parametrize('top', (0, 10))
+def test_write(tmp_path, top):
+    report = BuildReport()
+    report.record_fetch('https://a.com/', 1.0)
+    path = tmp_path / 'reports' / 'report.json'
+
+    BuildReport.write(report.as_dict(top), str(path))
+
+    assert len(json.loads(path.read_text())['slowest_urls']) == min(top, 1)
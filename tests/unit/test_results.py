@@ -0,0 +1,62 @@
+import json
+import xml.etree.ElementTree as ET
+
+from htmlproofer.results import LinkResult, open_result_sink
+
+RESULTS = [
+    LinkResult('https://example.com/?a=1&b="2"', 'index.md', 200, 0.1234, False, False),
+    LinkResult('missing.html', 'nested/page.md', 404, 0.001, False, True),
+    LinkResult('https://example.com/gone', 'index.md', 410, 0.0, True, True),
+]
+
+
+def write_results(path, results_format):
+    sink = open_result_sink(str(path), results_format)
+    for result in RESULTS:
+        sink.write(result)
+    sink.close()
+    sink.close()
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / 'results.jsonl'
+    write_results(path, 'jsonl')
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert records[0] == {
+        'url': 'https://example.com/?a=1&b="2"', 'page': 'index.md', 'status': 200,
+        'latency': 0.123, 'from_cache': False, 'invalid': False,
+    }
+    assert [record['invalid'] for record in records] == [False, True, True]
+
+
+def test_junit(tmp_path):
+    path = tmp_path / 'junit' / 'results.xml'
+    write_results(path, 'junit')
+
+    suite = ET.parse(path).getroot().find('testsuite')
+    testcases = suite.findall('testcase')
+    assert [testcase.get('name') for testcase in testcases] == [result.url for result in RESULTS]
+    assert testcases[1].get('classname') == 'nested/page.md'
+    assert [testcase.get('time') for testcase in testcases] == ['0.123', '0.001', '0.000']
+    assert [testcase.find('failure') is not None for testcase in testcases] == [False, True, True]
+    assert testcases[1].find('failure').get('message') == 'invalid url - missing.html [404]'
+
+
+def test_sarif(tmp_path):
+    path = tmp_path / 'results.sarif'
+    write_results(path, 'sarif')
+
+    log = json.loads(path.read_text())
+    assert log['version'] == '2.1.0'
+    results = log['runs'][0]['results']
+    assert [result['kind'] for result in results] == ['pass', 'fail', 'fail']
+    assert results[1]['locations'][0]['physicalLocation']['artifactLocation']['uri'] == 'nested/page.md'
+    assert results[2]['properties']['from_cache'] is True
+
+
+def test_sarif__no_results(tmp_path):
+    path = tmp_path / 'results.sarif'
+    open_result_sink(str(path), 'sarif').close()
+
+    assert json.loads(path.read_text())['runs'][0]['results'] == []
@@ -0,0 +1,127 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from htmlproofer.ratelimit import HostThrottled
+from htmlproofer.scheduler import RetryScheduler
+
+
+def test_submit__no_retry():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        scheduler = RetryScheduler(executor)
+        assert scheduler.submit(lambda: 200, lambda status, attempt: None).result(timeout=5) == 200
+        scheduler.close()
+
+
+def test_submit__retries_until_policy_stops():
+    statuses = iter([503, 503, 200])
+    attempts = []
+
+    def retry_policy(status, attempt):
+        attempts.append((status, attempt))
+        return 0.01 if status == 503 else None
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        scheduler = RetryScheduler(executor)
+        assert scheduler.submit(lambda: next(statuses), retry_policy).result(timeout=5) == 200
+        scheduler.close()
+    assert attempts == [(503, 0), (503, 1), (200, 2)]
+
+
+def test_submit__waiting_retry_does_not_hold_a_worker():
+    other_done = threading.Event()
+    retried_after_other = []
+
+    def slow_to_recover():
+        retried_after_other.append(other_done.is_set())
+        return 200 if len(retried_after_other) > 1 else 503
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        scheduler = RetryScheduler(executor)
+        retrying = scheduler.submit(slow_to_recover, lambda status, attempt: 0.2 if status == 503 else None)
+        other = scheduler.submit(lambda: 200, lambda status, attempt: None)
+        assert other.result(timeout=5) == 200
+        other_done.set()
+        assert retrying.result(timeout=5) == 200
+        scheduler.close()
+    assert retried_after_other == [False, True]
+
+
+def test_submit__host_throttled():
+    attempts = []
+
+    def throttled_once():
+        if not attempts:
+            attempts.append('throttled')
+            raise HostThrottled('github.com', 0.01)
+        attempts.append('checked')
+        return 503
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        scheduler = RetryScheduler(executor)
+        policy_calls = []
+        future = scheduler.submit(throttled_once, lambda status, attempt: policy_calls.append(attempt))
+        assert future.result(timeout=5) == 503
+        scheduler.close()
+    # Being throttled doesn't count as an attempt.
+    assert attempts == ['throttled', 'checked']
+    assert policy_calls == [0]
+
+
+def test_submit__host_throttled_until_released():
+    released = Future()
+    attempts = []
+
+    def throttled_once():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise HostThrottled('github.com', 60, released)
+        return 200
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        scheduler = RetryScheduler(executor)
+        future = scheduler.submit(throttled_once, lambda status, attempt: None)
+        assert not future.done()
+        # A request to the host ended: the check is run again without waiting for the delay.
+        assert released.set_running_or_notify_cancel()
+        released.set_result(None)
+        assert future.result(timeout=5) == 200
+        scheduler.close()
+    assert len(attempts) == 2
+
+
+def test_submit__executor_shut_down(caplog):
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+        return 200
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    scheduler = RetryScheduler(executor)
+    first = scheduler.submit(blocking, lambda status, attempt: None)
+    assert started.wait(5)
+    pending = [scheduler.submit(lambda: 200, lambda status, attempt: None) for _ in range(20)]
+    executor.shutdown(wait=False, cancel_futures=True)
+    release.set()
+
+    assert first.result(timeout=5) == 200
+    # The checks that hadn't started are cancelled too, without errors in the executor's callbacks.
+    assert all(future.cancelled() for future in pending)
+    assert 'exception calling callback' not in caplog.text
+    scheduler.close()
+
+
+def test_submit__exception():
+    def fail():
+        raise ValueError('boom')
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        scheduler = RetryScheduler(executor)
+        with pytest.raises(ValueError):
+            scheduler.submit(fail, lambda status, attempt: None).result(timeout=5)
+        scheduler.close()
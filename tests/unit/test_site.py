@@ -0,0 +1,88 @@
+from mkdocs.exceptions import PluginError
+import pytest
+
+from htmlproofer.__main__ import load_plugin_options, main
+from htmlproofer.site import BuiltSite, check_site
+
+
+@pytest.fixture
+def site_dir(tmp_path):
+    pages = {
+        'index.html': '<h1 id="home"></h1><a href="guide/">Guide</a><a href="#home"></a><img src="img/logo.png">',
+        'guide/index.html': '<h2 id="setup"></h2><a name="legacy"></a><a href="../index.html#home"></a>',
+        'guide/page.html': '<a href="/guide/#setup"></a><a href="index.html#legacy"></a><a href="my%20file.txt"></a>',
+        'guide/my file.txt': '',
+        'img/logo.png': '',
+    }
+    for path, content in pages.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    return tmp_path
+
+
+@pytest.mark.parametrize('processes', (1, 2))
+def test_built_site__read(site_dir, processes):
+    site = BuiltSite.read(str(site_dir), processes=processes)
+
+    assert site.files == {'index.html', 'guide/index.html', 'guide/page.html', 'guide/my file.txt', 'img/logo.png'}
+    assert site.pages.keys() == {'index.html', 'guide/index.html', 'guide/page.html'}
+    assert site.pages['guide/index.html'].element_ids == {'', 'setup', 'legacy'}
+    assert site.pages['index.html'].urls == {'guide/', '#home', 'img/logo.png'}
+
+
+@pytest.mark.parametrize(
+    'url, src_path, expected_status', [
+        ('guide/', 'index.html', 0),
+        ('guide', 'index.html', 0),
+        ('#home', 'index.html', 0),
+        ('#missing', 'index.html', 404),
+        ('../index.html#home', 'guide/index.html', 0),
+        ('/guide/#setup', 'guide/page.html', 0),
+        ('/guide/#missing', 'guide/page.html', 404),
+        ('index.html#legacy', 'guide/page.html', 0),
+        ('my%20file.txt', 'guide/page.html', 0),
+        ('../img/logo.png#ignored', 'guide/page.html', 0),
+        ('missing.html', 'index.html', 404),
+        ('../../outside.html', 'guide/page.html', 404),
+    ]
+)
+def test_built_site__get_url_status(site_dir, url, src_path, expected_status):
+    site = BuiltSite.read(str(site_dir), processes=1)
+    assert site.get_url_status(url, src_path) == expected_status
+
+
+@pytest.mark.parametrize('anchor_source', ('markdown', 'html'))
+def test_check_site(site_dir, anchor_source):
+    options = {'validate_external_urls': False, 'anchor_source': anchor_source}
+    check_site(str(site_dir), options, processes=1)
+
+    (site_dir / 'extra.html').write_text('<a href="guide/#missing"></a><a href="https://example.com"></a>')
+    with pytest.raises(PluginError):
+        check_site(str(site_dir), options, processes=1)
+    check_site(str(site_dir), {**options, 'ignore_pages': ['extra.html']}, processes=1)
+
+
+def test_load_plugin_options(tmp_path):
+    config_file = tmp_path / 'mkdocs.yml'
+    config_file.write_text('plugins:\n  - search\n  - htmlproofer:\n      skip_downloads: true\n')
+    assert load_plugin_options(str(config_file)) == {'skip_downloads': True}
+
+    config_file.write_text('plugins:\n  - search\n')
+    assert load_plugin_options(str(config_file)) == {}
+
+
+def test_main(site_dir):
+    assert main([str(site_dir), '--skip-external', '-j', '1']) == 0
+    (site_dir / 'extra.html').write_text('<a href="missing.html"></a>')
+    assert main([str(site_dir), '--skip-external', '-j', '1']) == 1
+
+
+def test_main__config_file(site_dir, tmp_path_factory, monkeypatch):
+    project_dir = tmp_path_factory.mktemp('project')
+    config_file = project_dir / 'mkdocs.yml'
+    config_file.write_text('plugins:\n  - htmlproofer:\n      results_file: reports/links.jsonl\n')
+    monkeypatch.chdir(tmp_path_factory.mktemp('cwd'))
+
+    assert main([str(site_dir), '--skip-external', '-j', '1', '-f', str(config_file)]) == 0
+    # Relative paths in the options are resolved against the directory of mkdocs.yml.
+    assert (project_dir / 'reports' / 'links.jsonl').exists()